@@ -0,0 +1,70 @@
+import io
+
+import pandas as pd
+import streamlit as st
+
+from predictors.batch import FORMATS, PREDICTION_COLUMNS, score_csv
+from predictors.registry import MODELS, get_registry
+
+# ---- PAGE CONFIG ----
+st.set_page_config(page_title="🗂️ Bulk Student Scoring", page_icon="🏫", layout="wide")
+
+# ---- HEADER ----
+st.markdown("<h1 style='text-align: center;'>🗂️ Bulk Student Scoring</h1>", unsafe_allow_html=True)
+st.markdown(
+    "<p style='text-align: center;'>Upload a CSV in the <code>Dataset/k-12.csv</code> format to score every "
+    "student with the assessment, promotion, recommendation and retention models at once.</p>",
+    unsafe_allow_html=True
+)
+
+# ---- UPLOAD ----
+uploaded_file = st.file_uploader("📄 Student CSV", type="csv")
+col1, col2 = st.columns(2)
+with col1:
+    names = st.multiselect("🧠 Models", list(MODELS), default=list(MODELS))
+with col2:
+    fmt = st.radio("💾 Output format", FORMATS, horizontal=True)
+
+# ---- SCORING ----
+if uploaded_file is not None and names and st.button("🚀 Score file"):
+    total_rows = max(uploaded_file.getvalue().count(b"\n") - 1, 1)
+    progress_bar = st.progress(0.0, text="Scoring...")
+    output = io.BytesIO() if fmt == "parquet" else io.StringIO()
+    try:
+        report = score_csv(
+            io.BytesIO(uploaded_file.getvalue()), output, names, fmt,
+            progress=lambda rows: progress_bar.progress(min(rows / total_rows, 1.0), text=f"{rows} rows scored"),
+        )
+    except Exception as e:
+        st.error(f"❌ Scoring failed: {e}")
+    else:
+        progress_bar.progress(1.0, text=f"✅ {report['rows']} rows scored")
+        data = output.getvalue()
+        st.session_state["bulk_scoring"] = {
+            "report": report,
+            "data": data if isinstance(data, bytes) else data.encode("utf-8"),
+            "file_name": f"{uploaded_file.name.rsplit('.', 1)[0]}_scored.{fmt}",
+        }
+
+# ---- RESULTS ----
+result = st.session_state.get("bulk_scoring")
+if result:
+    report = result["report"]
+    st.markdown("<h2 style='text-align: center;'>📊 Throughput</h2>", unsafe_allow_html=True)
+    metrics = st.columns(3)
+    metrics[0].metric("Rows", f"{report['rows']:,}")
+    metrics[1].metric("Rows / second", f"{report['rows_per_s']:,.0f}")
+    metrics[2].metric("Total time", f"{report['seconds']:.2f} s")
+    st.dataframe(pd.DataFrame(report["models"]).T, use_container_width=True)
+    if any(info["invalid_rows"] for info in report["models"].values()):
+        st.warning("⚠️ Some rows had missing values or unknown categories and were left unscored for those models.")
+
+    if report["format"] == "csv":
+        preview = pd.read_csv(io.BytesIO(result["data"]), nrows=20)
+    else:
+        preview = pd.read_parquet(io.BytesIO(result["data"])).head(20)
+    scored = [PREDICTION_COLUMNS[name] for name in report["models"]]
+    st.dataframe(preview[scored + [c for c in preview.columns if c not in scored]], use_container_width=True)
+    st.download_button("⬇️ Download scored file", result["data"], file_name=result["file_name"])
+
+st.caption(" · ".join(f"{name} v{get_registry().loaded(name).version}" for name in names))
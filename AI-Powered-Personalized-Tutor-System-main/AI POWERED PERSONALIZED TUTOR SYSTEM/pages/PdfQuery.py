@@ -1,13 +1,21 @@
 import streamlit as st
+import io
 import os
-import pickle
-from tempfile import NamedTemporaryFile
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from transformers import pipeline
-import faiss
-import glob
-from PyPDF2 import PdfReader
-import hashlib
+import time
+from rag.cache import QueryCache
+from rag.corpus import Corpus, ensure_corpus, read_corpus_meta
+from rag.embed_cache import EmbeddingCache
+from rag.extract import PageCache
+from rag.housekeeping import AUTO_GC, STORE_QUOTA_MB, housekeep, store_usage
+from rag.indexing import index_document
+from rag.ingest import content_hash
+from rag.jobs import DONE, FAILED, JobQueue
+from rag.models import (
+    BACKEND, ENCODER_MODEL, MODEL_SERVER, QA_MODEL, RERANKER_MODEL, WARM_UP, lazy_models, remote_models, warm_up,
+)
+from rag.retrieval import DEFAULT_CASCADE, answer_query
+from rag.store import index_exists, migrate_pickles, record_access
+from rag.summarize import SUMMARY_MODEL, read_summary, summarize_document
 
 # ----------- CONFIG -----------
 st.set_page_config(page_title="Smart PDF QA", page_icon="🧠", layout="wide")
@@ -18,132 +26,297 @@ st.markdown("Upload one or more PDFs and ask deep questions. Powered by cutting-
 # ----------- MODEL LOADING -----------
 @st.cache_resource
 def load_models():
-    encoder = SentenceTransformer('all-MiniLM-L6-v2')
-    reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-    qa = pipeline("question-answering", model="deepset/roberta-base-squad2")
-    return encoder, reranker, qa
+    # A shared model server batches requests across sessions (rag.server)
+    if MODEL_SERVER:
+        return remote_models(MODEL_SERVER)
+    # Lazy proxies: each model loads on first use, not when the page opens
+    models = lazy_models()
+    if WARM_UP:
+        warm_up(*models)
+    return models
 
 
 encoder, reranker, qa_pipeline = load_models()
+# A model server that is down refuses the connection (OSError) or answers with an error (RuntimeError)
+SERVER_ERRORS = (OSError, RuntimeError)
+
+
+def encoder_backend():
+    # The embedding cache key; None while the model server can't be reached
+    try:
+        return encoder.backend
+    except SERVER_ERRORS:
+        return None
+
+
+@st.cache_resource
+def load_summarizer():
+    from transformers import pipeline
+
+    return pipeline("summarization", model=SUMMARY_MODEL)
 
 
 # ----------- HELPERS -----------
-def clean_filename(name):
-    return hashlib.md5(name.encode()).hexdigest()[:12]
+def document_id(uploaded_file):
+    # Hash each upload once per session; reruns reuse the cached id.
+    ids = st.session_state.setdefault("doc_ids", {})
+    if uploaded_file.file_id not in ids:
+        ids[uploaded_file.file_id] = content_hash(uploaded_file)
+    return ids[uploaded_file.file_id]
 
 
-def save_index(filename, index, embeddings, chunks):
-    with open(f"indices/{filename}.pkl", "wb") as f:
-        pickle.dump((index, embeddings, chunks), f)
+@st.cache_resource
+def migrate_legacy_indices():
+    return migrate_pickles()
 
 
-def load_index(filename):
-    with open(f"indices/{filename}.pkl", "rb") as f:
-        return pickle.load(f)
+@st.cache_resource
+def get_embedding_cache(backend):
+    # Vectors from different backends differ slightly; never mix them
+    return EmbeddingCache(ENCODER_MODEL, backend)
 
 
-def index_pdf(file_path):
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
+@st.cache_resource
+def get_page_cache():
+    return PageCache()
 
-    reader = PdfReader(file_path)
-    text = "\n".join(page.extract_text() or '' for page in reader.pages)
 
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-    chunks = splitter.split_text(text)
+@st.cache_resource
+def get_query_cache():
+    # Shared by every session in this process
+    return QueryCache()
 
-    embeddings = encoder.encode(chunks, show_progress_bar=True)
-    dim = embeddings[0].shape[0]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
 
-    return index, embeddings, chunks
+@st.cache_resource
+def get_job_queue():
+    # One indexing pool per process. Finished documents are appended to the
+    # corpus on the worker thread, drop stale cached answers and may push
+    # the store over its quota
+    query_cache = get_query_cache()
 
+    def on_done(job):
+        ensure_corpus()
+        query_cache.invalidate_document(job.doc_id)
+        if STORE_QUOTA_MB:
+            housekeep(gc=False, protect={job.doc_id})
 
-def retrieve(query, index, chunks, encoder, reranker, k=10):
-    query_emb = encoder.encode([query])
-    _, I = index.search(query_emb, k)
-    retrieved = [chunks[i] for i in I[0]]
-    pairs = [[query, passage] for passage in retrieved]
-    scores = reranker.predict(pairs)
-    ranked = sorted(zip(retrieved, scores), key=lambda x: x[1], reverse=True)
-    return [r[0] for r in ranked[:5]]
+    return JobQueue(on_done=on_done)
 
 
-def generate_answer(query, contexts):
-    best_answer = None
-    best_score = 0
-    best_context = None
-    for context in contexts:
-        try:
-            result = qa_pipeline(question=query, context=context)
-            if result['score'] > best_score:
-                best_score = result['score']
-                best_answer = result['answer']
-                best_context = context
-        except:
-            continue
-    return best_answer, best_context
+@st.cache_resource
+def startup_housekeeping():
+    # Once per process, after migration so migrated documents count toward the quota
+    if AUTO_GC or STORE_QUOTA_MB:
+        return housekeep(gc=AUTO_GC)
+    return {}
+
+
+@st.cache_resource
+def sync_corpus():
+    # Once per process, for documents migrated or ingested by the CLI;
+    # afterwards the indexing jobs keep the corpus current
+    return ensure_corpus()
+
+
+@st.cache_resource
+def load_corpus(built_at):
+    # One Corpus per build; a rebuilt corpus gets a new built_at and cache entry
+    return Corpus(read_corpus_meta())
 
 
-# ----------- UI SECTION: PDF Upload and Selection -----------
+def cite(hit):
+    page = corpus.page_of(hit.doc_id, hit.chunk_id)
+    source = corpus.source_of(hit.doc_id)
+    return f"{source}, p. {page}" if page else source
+
+
+# ----------- UI SECTION: PDF Upload -----------
 os.makedirs("indices", exist_ok=True)
+migrate_legacy_indices()
+startup_housekeeping()
+sync_corpus()
 uploaded_files = st.file_uploader("📄 Upload one or more PDFs", type=["pdf"], accept_multiple_files=True)
 
-pdf_map = {}
+job_queue = get_job_queue()
+# Without the backend its vectors would be cached under the wrong key, so nothing is built
+backend = encoder_backend()
+if backend is None:
+    st.warning("⚠️ Model server unreachable: new PDFs will be indexed once it is back.")
+embedding_cache = get_embedding_cache(backend) if backend else None
+page_cache = get_page_cache()
+session_docs, builds = {}, {}
+
 for uploaded_file in uploaded_files:
-    st.toast(f"📥 Processing {uploaded_file.name}")
-    filename = clean_filename(uploaded_file.name)
-    file_path = f"temp_{filename}.pdf"
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.read())
-
-    if not os.path.exists(f"indices/{filename}.pkl"):
-        st.info(f"🔎 Indexing {uploaded_file.name}...")
-        index, embeddings, chunks = index_pdf(file_path)
-        save_index(filename, index, embeddings, chunks)
-    pdf_map[uploaded_file.name] = filename
-
-if pdf_map:
-    st.success("✅ All PDFs indexed.")
-    selected_pdf = st.selectbox("📑 Choose a PDF to query:", list(pdf_map.keys()))
-    if selected_pdf:
-        index, embeddings, chunks = load_index(pdf_map[selected_pdf])
-
-        # ----------- UI SECTION: Ask Queries -----------
-        st.subheader("💬 Ask a question about the PDF")
-        query = st.text_input("Type your question here:")
-        if st.button("🔍 Get Answer") and query:
-            with st.spinner("Thinking..."):
-                retrieved = retrieve(query, index, chunks, encoder, reranker)
-                answer, context = generate_answer(query, retrieved)
-                if answer:
-                    st.markdown(f"### ✅ **Answer:** `{answer}`")
-                    st.markdown("#### 📖 Context Highlighted:")
-                    highlighted = context.replace(answer, f"**:blue[{answer}]**")
-                    st.markdown(highlighted)
-                else:
-                    st.warning("❌ Sorry, I couldn't find an exact answer. Try rephrasing!")
-
-                with st.expander("📄 Show All Retrieved Contexts"):
-                    for i, passage in enumerate(retrieved, 1):
-                        st.markdown(f"**Context {i}:** {passage}")
+    doc_id = document_id(uploaded_file)
+    session_docs[doc_id] = uploaded_file.name
+    if index_exists(doc_id):
+        record_access(doc_id)
+        continue
+    if backend is None:
+        continue
+
+    def build(job, uploaded_file=uploaded_file, doc_id=doc_id):
+        # Runs on a worker thread: no Streamlit calls in here
+        index_document(
+            doc_id, io.BytesIO(uploaded_file.getvalue()), encoder, uploaded_file.name,
+            progress=job.report, embedding_cache=embedding_cache, page_cache=page_cache,
+        )
+
+    builds[doc_id] = build
+    job_queue.submit(doc_id, uploaded_file.name, build)
+
+
+@st.fragment(run_every=2)
+def show_indexing_jobs():
+    jobs = [job for job in job_queue.jobs() if job.doc_id in session_docs]
+    for job in jobs:
+        if job.state == FAILED:
+            st.error(f"❌ Indexing {job.name} failed: {job.error}")
+            if job.doc_id in builds and st.button(f"🔁 Retry {job.name}", key=f"retry-{job.doc_id}"):
+                job_queue.submit(job.doc_id, job.name, builds[job.doc_id], retry=True)
+        elif job.state != DONE:
+            text = f"🔎 Indexing {job.name}: page {job.pages_done}/{job.total_pages}, {job.chunks_done} chunks embedded"
+            st.progress(job.fraction, text=text if job.started_at else f"⏳ {job.name} is queued")
+
+    # A newly finished document is in the corpus; rerun to load that version.
+    # Jobs, not doc ids, are tracked: an evicted document gets a new job
+    ready = {(job.doc_id, job.submitted_at) for job in jobs if job.state == DONE}
+    seen = st.session_state.setdefault("ready_jobs", set())
+    if ready - seen:
+        for job in jobs:
+            if (job.doc_id, job.submitted_at) in ready - seen and job.built:
+                st.toast(f"📥 Indexed {job.name}")
+        seen.update(ready)
+        st.rerun()
+
+
+show_indexing_jobs()
+
+# Never built here: the jobs publish new corpus versions in the background
+corpus = load_corpus((read_corpus_meta() or ensure_corpus())["built_at"])
+query_cache = get_query_cache()
+
+searchable = {doc["id"] for doc in corpus.documents} | set(corpus.meta.get("skipped", ()))
+# Failed jobs already show an error and a retry button above
+failed = {job.doc_id for job in job_queue.jobs() if job.state == FAILED}
+pending = [name for doc_id, name in session_docs.items() if doc_id not in searchable and doc_id not in failed]
+if pending:
+    st.info(f"⏳ Still indexing {', '.join(pending)}. You can already ask about the PDFs that are ready.")
+
+if corpus.count:
+    st.success(f"✅ {len(corpus.documents)} PDF(s) indexed and searchable together.")
+    sources = {doc["id"]: doc["source"] for doc in corpus.documents}
+    selected_docs = st.multiselect(
+        "📑 Limit the search to these PDFs (leave empty to search all):",
+        list(sources), default=[], format_func=sources.get,
+    )
+
+    # ----------- UI SECTION: Ask Queries -----------
+    st.subheader("💬 Ask a question about your PDFs")
+    query = st.text_input("Type your question here:")
+    if st.button("🔍 Get Answer") and query:
+        with st.spinner("Thinking..."):
+            started = time.perf_counter()
+            scope = corpus.scope(selected_docs)
+            cached = query_cache.get_answer(scope, query)
+            if cached:
+                hits, answer, context = cached
+                retrieved = [hit.text for hit in hits]
+                total_ms = (time.perf_counter() - started) * 1000
+                st.caption(f"⏱️ {total_ms:.0f} ms total · answered from cache")
+            else:
+                try:
+                    query_emb = query_cache.embedding(query, lambda: encoder.encode([query]))
+                    hits, answer, context, trace = answer_query(
+                        query, corpus, encoder, reranker, qa_pipeline,
+                        doc_ids=selected_docs or None, query_emb=query_emb,
+                    )
+                    query_cache.put_answer(scope, query, hits, answer, context)
+                except SERVER_ERRORS as e:
+                    st.error(f"❌ The models are unavailable (server unreachable or backend failed to load): {e}")
+                    hits, answer, context, trace = [], None, None, {}
+                except Exception as e:
+                    st.error(f"❌ Question answering failed: {e}")
+                    hits, answer, context, trace = [], None, None, {}
+                retrieved = [hit.text for hit in hits]
+                total_ms = (time.perf_counter() - started) * 1000
+                qa_stats = trace.get("qa", {})
+                st.caption(
+                    f"⏱️ {total_ms:.0f} ms total (budget {DEFAULT_CASCADE.budget_ms:.0f} ms) · "
+                    f"rerank: {trace.get('rerank', 'n/a')} · "
+                    f"QA read {qa_stats.get('contexts_read', 0)}/{qa_stats.get('contexts', 0)} contexts "
+                    f"in {qa_stats.get('qa_ms', 0.0):.0f} ms"
+                )
+                with st.expander("🧭 Retrieval cascade decisions"):
+                    st.json(trace)
+            if answer:
+                st.markdown(f"### ✅ **Answer:** `{answer}`")
+                st.markdown("#### 📖 Context Highlighted:")
+                highlighted = context.replace(answer, f"**:blue[{answer}]**")
+                st.markdown(highlighted)
+                st.caption(f"📄 Source: {cite(hits[retrieved.index(context)])}")
+            else:
+                st.warning("❌ Sorry, I couldn't find an exact answer. Try rephrasing!")
+
+            with st.expander("📄 Show All Retrieved Contexts"):
+                for i, hit in enumerate(hits, 1):
+                    st.markdown(f"**Context {i}** _({cite(hit)})_**:** {hit.text}")
 
 # ----------- OPTIONAL FEATURE: Summarizer -----------
 st.divider()
 st.subheader("📝 Want a quick summary?")
 if st.button("📃 Generate PDF Summary") and uploaded_files:
     for file in uploaded_files:
-        reader = PdfReader(file)
-        full_text = "\n".join([page.extract_text() or '' for page in reader.pages])
-        summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-        summary = summarizer(full_text[:1024], max_length=130, min_length=30, do_sample=False)[0]['summary_text']
+        doc_id = document_id(file)
+        if not index_exists(doc_id):
+            st.info(f"⏳ {file.name} is still being indexed.")
+            continue
+        summary = read_summary(doc_id)
+        if summary is None:
+            with st.spinner(f"Summarizing {file.name}..."):
+                summary = summarize_document(doc_id, load_summarizer())
         st.markdown(f"### Summary of **{file.name}**")
         st.info(summary)
 
 st.sidebar.title("⚙️ Models Used")
-st.sidebar.markdown("- SentenceTransformer: `all-MiniLM-L6-v2`")
-st.sidebar.markdown("- Reranker: `cross-encoder/ms-marco-MiniLM-L-6-v2`")
-st.sidebar.markdown("- QA: `deepset/roberta-base-squad2`")
+st.sidebar.markdown(f"- SentenceTransformer: `{ENCODER_MODEL}`")
+st.sidebar.markdown(f"- Reranker: `{RERANKER_MODEL}`")
+st.sidebar.markdown(f"- QA: `{QA_MODEL}`")
+if MODEL_SERVER:
+    st.sidebar.markdown(f"- Model server: `{MODEL_SERVER}` (batched across sessions)")
+else:
+    st.sidebar.markdown(f"- CPU backend: `{BACKEND}`")
+for model in (encoder, reranker, qa_pipeline):
+    try:
+        status = f"loaded in {model.load_seconds:.1f} s" if model.loaded else "not loaded yet"
+    except SERVER_ERRORS:
+        status = "server unreachable"
+    st.sidebar.caption(f"{model.name}: {status}")
+
+ann = corpus.meta.get("ann", {})
+st.sidebar.markdown(f"- Search index: `{ann.get('type', 'flat')}` over {corpus.count} chunks")
+if "ann_ms_per_query" in ann:
+    st.sidebar.markdown(
+        f"- Recall@{ann['k']} vs. flat: {ann['recall_at_k']:.1%} "
+        f"({ann['ann_ms_per_query']:.2f} ms vs. {ann['flat_ms_per_query']:.2f} ms per query)"
+    )
+
+cache_stats = query_cache.stats()
+st.sidebar.markdown(
+    f"- Answer cache: {cache_stats['answers']['hits']} hits / {cache_stats['answers']['misses']} misses "
+    f"({cache_stats['answers']['hit_rate']:.0%}), {cache_stats['answers']['size']} entries"
+)
+st.sidebar.markdown(
+    f"- Query embedding cache: {cache_stats['embeddings']['hits']} hits / {cache_stats['embeddings']['misses']} misses"
+)
+
+usage = store_usage()
+quota = f" of {usage['quota_bytes'] / 2 ** 20:.0f} MiB quota" if usage["quota_bytes"] else ""
+st.sidebar.markdown(
+    f"- Index store: {usage['total_bytes'] / 2 ** 20:.1f} MiB{quota} over {len(usage['documents'])} PDF(s) "
+    f"(corpus {usage['corpus_bytes'] / 2 ** 20:.1f} MiB, caches {usage['cache_bytes'] / 2 ** 20:.1f} MiB), "
+    f"{len(corpus.pinned)} pinned in memory"
+)
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("Built with ❤️ for the **AI-Powered Personalized Tutor System**.")
@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 import time
-import pickle  
+
+from predictors.registry import describe, get_registry
 
 # ---- PAGE CONFIG ----
 st.set_page_config(
@@ -11,8 +12,7 @@ st.set_page_config(
 )
 
 # ---- LOAD MODEL ----
-with open("Assesment score.pkl", "rb") as model_file:  # Change model filename if needed
-    pipeline = pickle.load(model_file)
+model = get_registry().loaded("assessment")
 
 # ---- CUSTOM CSS FOR WHITE THEME ----
 st.markdown("""
@@ -135,7 +135,7 @@ if submitted:
             progress_bar.progress(percent_complete + 1)
 
     # Making the prediction
-    predicted_score = pipeline.predict(input_data)[0]
+    predicted_score = model.predict(input_data)[0]
 
     # ---- RESULT DISPLAY ----
     st.markdown("<h2>📊 Prediction Result</h2>", unsafe_allow_html=True)
@@ -151,5 +151,4 @@ if submitted:
         unsafe_allow_html=True
     )
 
-
-
+st.caption(describe(model))
@@ -1,15 +1,15 @@
 import streamlit as st
 import pandas as pd
 import time
-import pickle
 from streamlit_extras.let_it_rain import rain  
 
+from predictors.registry import describe, get_registry
+
 # ---- PAGE CONFIG ----
 st.set_page_config(page_title="🎓 Student Promotion Predictor", page_icon="📚", layout="wide")
 
 # ---- LOAD MODEL ----
-with open("promotion.pkl", "rb") as model_file:
-    pipeline = pickle.load(model_file)
+model = get_registry().loaded("promotion")
 
 # ---- CUSTOM CSS FOR WHITE THEME ----
 st.markdown("""
@@ -136,7 +136,7 @@ if submitted:
             progress_bar.progress(percent_complete + 1)
 
     # Making the prediction
-    prediction = pipeline.predict(input_data)
+    prediction = model.predict(input_data)
 
     # ---- RESULT DISPLAY ----
     st.markdown("<h2>📊 Prediction Result</h2>", unsafe_allow_html=True)
@@ -176,4 +176,4 @@ if submitted:
             unsafe_allow_html=True
         )
 
-
+st.caption(describe(model))
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-import pickle
+
+from predictors.registry import describe, get_registry
 
 # ---- PAGE CONFIG ----
 st.set_page_config(
@@ -10,8 +11,7 @@ st.set_page_config(
 )
 
 # ---- LOAD ML MODEL ----
-with open("recomendation.pkl", "rb") as f:
-    pipeline = pickle.load(f)
+model = get_registry().loaded("recommendation")
 
 # ---- RECOMMENDED MATERIALS ----
 recommended_material = {
@@ -185,7 +185,7 @@ if submitted:
 
     try:
         # Make Prediction
-        prediction = pipeline.predict(input_data)
+        prediction = model.predict(input_data)
 
         # ---- SHOW RECOMMENDATIONS ----
         st.subheader("📚 **Recommended Learning Resources:**")
@@ -214,3 +214,4 @@ if submitted:
         st.error(f"❌ An error occurred: {e}")
 
 # ---- FOOTER ----
+st.caption(describe(model))
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-import pickle
+
+from predictors.registry import describe, get_registry
 
 # Custom CSS for black text, white background, and styled recommendations
 st.markdown(
@@ -39,15 +40,8 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Load the trained model from the .pkl file
-@st.cache_resource
-def load_model():
-    with open("skipRetention.pkl", "rb") as f:   # Replace with your actual .pkl file name
-        pipeline = pickle.load(f)
-    return pipeline
-
-# Load the model
-pipeline = load_model()
+# Load the trained model
+model = get_registry().loaded("retention")
 
 # Labels for recommendations (updated as per your request)
 y = [
@@ -70,7 +64,7 @@ level = st.selectbox(
 # Function to reshape input properly
 def reshape_input(level):
     """Ensures consistent 2D input format for model"""
-    return pd.DataFrame([[level]])
+    return pd.DataFrame({"Level": [level]})
 
 # Make prediction
 if st.button("Get Content"):
@@ -78,7 +72,7 @@ if st.button("Get Content"):
 
     # Perform prediction with error handling
     try:
-        prediction = pipeline.predict(input_data)
+        prediction = model.predict(input_data)
 
         # Recommendation function with corrected mapping
         def recommend(n):
@@ -105,3 +99,5 @@ if st.button("Get Content"):
     except Exception as e:
         st.error(f"❌ Error: {e}")
         st.write("⚠️ Please check the input format or model compatibility.")
+
+st.caption(describe(model))
@@ -0,0 +1 @@
+"""Tabular prediction pipelines shared by the score, promotion, recommendation and retention pages."""
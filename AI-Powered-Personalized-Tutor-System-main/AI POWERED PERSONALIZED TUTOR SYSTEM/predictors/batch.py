@@ -0,0 +1,182 @@
+"""Bulk scoring of student CSVs with every tabular pipeline.
+
+Files in the ``Dataset/k-12.csv`` schema are read in chunks of
+``PREDICTORS_CHUNK_ROWS`` rows, and each chunk goes through each selected
+pipeline in a single vectorised ``predict`` call. The scored chunk (the
+input columns plus one prediction column per model) is appended to a CSV
+or Parquet file, so memory stays flat however large the district file is::
+
+    python -m predictors.batch Dataset/k-12.csv scored.parquet [--models promotion retention]
+
+Rows a model cannot score (missing values, or a category its encoders
+never saw) get an empty prediction instead of failing the whole chunk, and
+are counted in the report. Predictions are the pipelines' raw outputs:
+the score, promoted as 0/1, and the recommendation and retention class
+codes the pages map to materials.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from predictors.registry import MODELS, get_registry
+
+CHUNK_ROWS = int(os.environ.get("PREDICTORS_CHUNK_ROWS", "50000"))
+FORMATS = ("csv", "parquet")
+
+PREDICTION_COLUMNS = {
+    "assessment": "predicted_assessment_score",
+    "promotion": "predicted_promoted",
+    "recommendation": "predicted_recommendation",
+    "retention": "predicted_retention",
+}
+
+
+def output_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return "parquet" if str(path).lower().endswith((".parquet", ".pq")) else "csv"
+
+
+def valid_rows(model, frame):
+    """Mask of the rows ``model`` can score."""
+    valid = frame[list(model.spec.features)].notna().all(axis=1).to_numpy()
+    for feature, allowed in model.categories.items():
+        valid = valid & frame[feature].isin(list(allowed)).to_numpy()
+    return valid
+
+
+def score_frame(frame, models):
+    """Prediction columns for ``frame``, with per-model seconds and invalid row counts."""
+    predictions, seconds, invalid = {}, {}, {}
+    for model in models:
+        started = time.perf_counter()
+        valid = valid_rows(model, frame)
+        column = pd.Series(np.nan, index=frame.index)
+        if valid.any():
+            column[valid] = model.pipeline.predict(model.frame(frame[valid]))
+        if hasattr(model.pipeline, "classes_"):
+            # Nullable integers keep class codes integral next to unscored rows
+            column = column.astype("Int64")
+        predictions[PREDICTION_COLUMNS[model.spec.name]] = column
+        seconds[model.spec.name] = time.perf_counter() - started
+        invalid[model.spec.name] = int((~valid).sum())
+    return pd.DataFrame(predictions, index=frame.index), seconds, invalid
+
+
+# ----------- OUTPUT -----------
+class CsvSink:
+    def __init__(self, target):
+        self.target = target
+        self.header = True
+
+    def write(self, frame):
+        frame.to_csv(self.target, mode="w" if self.header else "a", header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+
+
+class ParquetSink:
+    def __init__(self, target):
+        self.target = target
+        self.writer = None
+        self.schema = None
+
+    def write(self, frame):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(f"Parquet output needs pyarrow (pip install pyarrow), or write CSV: {e}")
+
+        if self.writer is None:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            self.schema = table.schema
+            self.writer = pq.ParquetWriter(self.target, self.schema)
+        else:
+            # Later chunks must match the first one's column types
+            table = pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def score_csv(source, target, names=None, fmt=None, chunk_rows=CHUNK_ROWS, registry=None, progress=None):
+    """Score ``source`` (a path or file-like CSV) into ``target``; returns a throughput report.
+
+    ``progress(rows_done)`` is called after every chunk.
+    """
+    registry = registry or get_registry()
+    names = list(names or MODELS)
+    models = [registry.loaded(name) for name in names]
+    fmt = output_format(target, fmt)
+    sink = ParquetSink(target) if fmt == "parquet" else CsvSink(target)
+
+    rows, read_seconds, write_seconds = 0, 0.0, 0.0
+    model_seconds = dict.fromkeys(names, 0.0)
+    invalid = dict.fromkeys(names, 0)
+    started = time.perf_counter()
+    try:
+        chunks = pd.read_csv(source, chunksize=chunk_rows)
+        while True:
+            tick = time.perf_counter()
+            chunk = next(chunks, None)
+            read_seconds += time.perf_counter() - tick
+            if chunk is None:
+                break
+            missing = sorted({f for model in models for f in model.spec.features} - set(chunk.columns))
+            if missing:
+                raise ValueError(f"input is missing column(s) {', '.join(missing)}")
+            predictions, seconds, bad = score_frame(chunk, models)
+            for name in names:
+                model_seconds[name] += seconds[name]
+                invalid[name] += bad[name]
+            tick = time.perf_counter()
+            sink.write(pd.concat([chunk, predictions], axis=1))
+            write_seconds += time.perf_counter() - tick
+            rows += len(chunk)
+            if progress is not None:
+                progress(rows)
+    finally:
+        sink.close()
+
+    total = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "format": fmt,
+        "chunk_rows": chunk_rows,
+        "seconds": total,
+        "rows_per_s": rows / total if total else 0.0,
+        "read_seconds": read_seconds,
+        "write_seconds": write_seconds,
+        "models": {
+            name: {
+                "version": model.version,
+                "seconds": model_seconds[name],
+                "rows_per_s": rows / model_seconds[name] if model_seconds[name] else 0.0,
+                "invalid_rows": invalid[name],
+            }
+            for name, model in zip(names, models)
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a student CSV with the tabular prediction pipelines.")
+    parser.add_argument("input", help="CSV in the Dataset/k-12.csv schema")
+    parser.add_argument("output", help=".csv or .parquet")
+    parser.add_argument("--models", nargs="+", choices=list(MODELS), default=list(MODELS))
+    parser.add_argument("--format", choices=FORMATS, help="default: from the output extension")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    report = score_csv(args.input, args.output, args.models, args.format, args.chunk_rows,
+                       progress=lambda rows: print(f"{rows} rows scored", flush=True))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,303 @@
+"""Compile the fitted pipelines into NumPy-only predictors.
+
+For a single student, ``pipeline.predict`` spends nearly all its time
+building a DataFrame and running the ColumnTransformer and StandardScaler
+machinery; the model math is tiny. ``compile_model`` reads the fitted
+pipeline once and keeps only arrays:
+
+    categories   value -> code tables, with the encoded and scaled output
+                 columns of every code precomputed (the scaler folded in)
+    numeric      (x - mean) / scale per passthrough column
+    forests      every tree flattened into shared feature/threshold/child/
+                 value arrays, walked for all trees at once
+    linear       coef and intercept
+    table        pipelines whose inputs are all categorical, with at most
+                 ``PREDICTORS_TABLE_LIMIT`` combinations (the xgboost
+                 retention model), become a lookup of the original
+                 pipeline's prediction for every combination
+
+The arithmetic mirrors scikit-learn's, operation for operation (float32
+inputs to the trees, trees accumulated in order), so predictions are
+identical, not merely close. ``verify`` checks that against the original
+pipelines over a CSV::
+
+    python -m predictors.compiled [--data Dataset/k-12.csv]
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+
+from predictors.registry import TABLE_LIMIT, ModelRegistry, get_registry, input_space
+
+VERIFY_DATA = os.path.join("Dataset", "k-12.csv")
+
+
+# ----------- PREPROCESSING -----------
+def _output_columns(spec, first):
+    """``[(kind, feature, categories)]`` for every column the preprocessor outputs.
+
+    ``kind`` is ``num`` (passthrough), ``ordinal`` (one column holding the
+    category code) or ``onehot`` (one column per kept category).
+    """
+    if not hasattr(first, "transformers_"):
+        return [("ordinal", spec.features[i], list(c)) for i, c in enumerate(first.categories_)]
+    names = list(first.feature_names_in_)
+    outputs = []
+    for _, transformer, columns in first.transformers_:
+        if isinstance(transformer, str) and transformer == "drop":
+            continue
+        features = [names[c] if isinstance(c, (int, np.integer)) else c for c in columns]
+        kind = type(transformer).__name__
+        if transformer == "passthrough" or (kind == "FunctionTransformer" and transformer.func is None):
+            outputs += [("num", f, None) for f in features]
+        elif kind == "OrdinalEncoder":
+            outputs += [("ordinal", f, list(c)) for f, c in zip(features, transformer.categories_)]
+        elif kind == "OneHotEncoder":
+            drop = transformer.drop_idx_ if transformer.drop_idx_ is not None else [None] * len(features)
+            for i, (f, c) in enumerate(zip(features, transformer.categories_)):
+                kept = [j for j in range(len(c)) if j != drop[i]]
+                outputs += [("onehot", f, (list(c), j)) for j in kept]
+        else:
+            raise TypeError(f"cannot compile a {kind} in {spec.name}")
+    return outputs
+
+
+class Encoder:
+    """Raw feature values -> the float64 matrix the estimator sees."""
+
+    def __init__(self, spec, outputs, mean=None, scale=None):
+        n_out = len(outputs)
+        mean = np.zeros(n_out) if mean is None else np.asarray(mean, dtype="float64")
+        scale = np.ones(n_out) if scale is None else np.asarray(scale, dtype="float64")
+        self.n_out = n_out
+        self.numeric = []        # (input position, output column)
+        self.categorical = {}    # input position -> (value -> code, output columns, codes x columns)
+        for column, (kind, feature, info) in enumerate(outputs):
+            position = spec.features.index(feature)
+            if kind == "num":
+                self.numeric.append((position, column))
+                continue
+            categories = info if kind == "ordinal" else info[0]
+            codes, columns, encoded = self.categorical.get(
+                position, ({value: code for code, value in enumerate(categories)}, [], []))
+            if kind == "ordinal":
+                raw = np.arange(len(categories), dtype="float64")
+            else:
+                raw = (np.arange(len(categories)) == info[1]).astype("float64")
+            # Same operations as StandardScaler.transform, done once per category
+            columns.append(column)
+            encoded.append((raw - mean[column]) / scale[column])
+            self.categorical[position] = (codes, columns, encoded)
+        self.categorical = {
+            position: (codes, np.array(columns), np.stack(encoded, axis=1))
+            for position, (codes, columns, encoded) in self.categorical.items()
+        }
+        self.numeric_positions = np.array([p for p, _ in self.numeric], dtype="int64")
+        self.numeric_columns = np.array([c for _, c in self.numeric], dtype="int64")
+        self.mean = mean[self.numeric_columns]
+        self.scale = scale[self.numeric_columns]
+
+    def codes(self, position, values):
+        table = self.categorical[position][0]
+        try:
+            return np.array([table[v] for v in values], dtype="int64")
+        except KeyError as e:
+            raise ValueError(f"unknown category {e.args[0]!r}") from None
+
+    def encode(self, rows):
+        """``rows``: n x features, in the spec's feature order."""
+        rows = list(rows)
+        out = np.empty((len(rows), self.n_out))
+        if len(self.numeric_positions):
+            numeric = np.array([[row[p] for p in self.numeric_positions] for row in rows], dtype="float64")
+            out[:, self.numeric_columns] = (numeric - self.mean) / self.scale
+        for position, (_, columns, encoded) in self.categorical.items():
+            out[:, columns] = encoded[self.codes(position, [row[position] for row in rows])]
+        return out
+
+
+# ----------- ESTIMATORS -----------
+class Forest:
+    """All trees of a forest (or one tree) in flat arrays."""
+
+    def __init__(self, trees, n_classes=None):
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            n = tree.node_count
+            ids = np.arange(offset, offset + n)
+            leaf = tree.children_left == -1
+            roots.append(offset)
+            # Leaves point at themselves, so every walk can take max_depth steps
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            left.append(np.where(leaf, ids, tree.children_left + offset))
+            right.append(np.where(leaf, ids, tree.children_right + offset))
+            value.append(tree.value[:, 0, 0] if n_classes is None else tree.value[:, 0, :n_classes])
+            offset += n
+        self.feature = np.concatenate(feature).astype("int64")
+        self.threshold = np.concatenate(threshold)
+        self.left = np.concatenate(left).astype("int64")
+        self.right = np.concatenate(right).astype("int64")
+        self.value = np.concatenate(value)
+        self.roots = np.array(roots, dtype="int64")
+        self.depth = max(tree.max_depth for tree in trees)
+
+    def leaves(self, X):
+        # Trees compare float32 features against float64 thresholds
+        X = X.astype("float32")
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def accumulate(self, X):
+        """Sum of the tree outputs, added tree by tree like scikit-learn, over the tree count."""
+        values = self.value[self.leaves(X)]
+        total = np.zeros(values.shape[:1] + values.shape[2:])
+        for t in range(len(self.roots)):
+            total += values[:, t]
+        total /= len(self.roots)
+        return total
+
+
+class CompiledPredictor:
+    def __init__(self, spec, version, kind, encoder=None, forest=None, coef=None, intercept=None,
+                 classes=None, table=None):
+        self.spec = spec
+        self.version = version
+        self.kind = kind
+        self.encoder = encoder
+        self.forest = forest
+        self.coef = coef
+        self.intercept = intercept
+        self.classes = classes
+        self.table = table
+
+    def predict_rows(self, rows):
+        """Predictions for ``rows`` of raw values in ``spec.features`` order."""
+        if self.kind == "table":
+            keys, outputs = self.table
+            try:
+                return outputs[[keys[tuple(row)] for row in rows]]
+            except KeyError as e:
+                raise ValueError(f"unknown category combination {e.args[0]!r}") from None
+        X = self.encoder.encode(rows)
+        if self.kind == "forest_regressor":
+            return self.forest.accumulate(X)
+        if self.kind == "forest_classifier":
+            return self.classes.take(np.argmax(self.forest.accumulate(X), axis=1))
+        scores = X @ self.coef.T + self.intercept
+        if scores.shape[1] == 1:
+            return self.classes[(scores[:, 0] > 0).astype("int64")]
+        return self.classes.take(np.argmax(scores, axis=1))
+
+    def predict_one(self, row):
+        return self.predict_rows([row])[0]
+
+    def predict(self, frame):
+        """Like ``pipeline.predict`` on a DataFrame with the model's columns."""
+        columns = [frame[f].tolist() for f in self.spec.features]
+        return self.predict_rows(list(zip(*columns)))
+
+
+# ----------- COMPILER -----------
+def _tabulate(model):
+    import pandas as pd
+
+    categories = [sorted(model.categories[f]) for f in model.spec.features]
+    combinations = list(itertools.product(*categories))
+    frame = pd.DataFrame(combinations, columns=list(model.spec.features))
+    outputs = np.asarray(model.pipeline.predict(model.frame(frame)))
+    return {combination: i for i, combination in enumerate(combinations)}, outputs
+
+
+def compile_model(model):
+    """A ``CompiledPredictor`` for a registry ``LoadedModel``."""
+    steps = [step for _, step in model.pipeline.steps]
+    first, estimator = steps[0], steps[-1]
+    outputs = _output_columns(model.spec, first)
+    estimator_kind = type(estimator).__name__
+    common = dict(spec=model.spec, version=model.version)
+
+    size = input_space(model.spec, model.categories)
+    if size is not None and size <= TABLE_LIMIT:
+        return CompiledPredictor(kind="table", table=_tabulate(model), **common)
+
+    mean = scale = None
+    for step in steps[1:-1]:
+        if type(step).__name__ != "StandardScaler":
+            raise TypeError(f"cannot compile a {type(step).__name__} in {model.spec.name}")
+        mean, scale = step.mean_, step.scale_
+    encoder = Encoder(model.spec, outputs, mean, scale)
+
+    if estimator_kind in ("RandomForestRegressor", "ExtraTreesRegressor", "DecisionTreeRegressor"):
+        trees = [e.tree_ for e in getattr(estimator, "estimators_", [estimator])]
+        return CompiledPredictor(kind="forest_regressor", encoder=encoder, forest=Forest(trees), **common)
+    if estimator_kind in ("RandomForestClassifier", "ExtraTreesClassifier", "DecisionTreeClassifier"):
+        trees = [e.tree_ for e in getattr(estimator, "estimators_", [estimator])]
+        return CompiledPredictor(kind="forest_classifier", encoder=encoder,
+                                 forest=Forest(trees, len(estimator.classes_)), classes=estimator.classes_, **common)
+    if estimator_kind == "LogisticRegression":
+        return CompiledPredictor(kind="linear", encoder=encoder, coef=estimator.coef_,
+                                 intercept=estimator.intercept_, classes=estimator.classes_, **common)
+    raise TypeError(f"cannot compile a {estimator_kind} in {model.spec.name}")
+
+
+# ----------- VERIFICATION -----------
+def _single_row_seconds(fn, repeat):
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def verify(data=VERIFY_DATA, names=None, registry=None, repeat=200):
+    """Compare every compiled predictor with its pipeline on all rows of ``data``."""
+    import pandas as pd
+
+    from predictors.batch import valid_rows
+
+    registry = registry or get_registry()
+    frame = pd.read_csv(data)
+    report = {}
+    for name in names or registry.names():
+        model = registry.loaded(name)
+        compiled = compile_model(model)
+        rows = frame[valid_rows(model, frame)]
+        expected = np.asarray(model.pipeline.predict(model.frame(rows)))
+        actual = compiled.predict(rows)
+        mismatches = int(np.sum(expected != actual))
+
+        one = rows.iloc[[0]]
+        row = tuple(one[list(model.spec.features)].iloc[0].tolist())
+        report[name] = {
+            "kind": compiled.kind,
+            "rows": len(rows),
+            "mismatches": mismatches,
+            "exact": mismatches == 0,
+            "pipeline_single_row_us": _single_row_seconds(lambda: model.pipeline.predict(model.frame(one)), repeat) * 1e6,
+            "compiled_single_row_us": _single_row_seconds(lambda: compiled.predict_one(row), repeat) * 1e6,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the prediction pipelines and check them against the originals.")
+    parser.add_argument("--data", default=VERIFY_DATA, help="CSV to compare predictions on")
+    parser.add_argument("--model-dir", default=None)
+    parser.add_argument("--repeat", type=int, default=200, help="single-row timing repetitions")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(model_dir=args.model_dir) if args.model_dir else get_registry()
+    report = verify(args.data, registry=registry, repeat=args.repeat)
+    print(json.dumps(report, indent=2))
+    if not all(r["exact"] for r in report.values()):
+        raise SystemExit("compiled predictions differ from the pipelines")
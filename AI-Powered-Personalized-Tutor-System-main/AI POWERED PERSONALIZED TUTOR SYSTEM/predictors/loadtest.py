@@ -0,0 +1,75 @@
+"""Load test for a running ``predictors.server``.
+
+Sends single-row requests built from real students in ``Dataset/k-12.csv``
+from ``--concurrency`` threads, each with its own keep-alive connection,
+then prints client-side throughput and latency next to the server's own
+batching statistics::
+
+    python -m predictors.server &
+    python -m predictors.loadtest [--model promotion] [--requests 5000] [--concurrency 32]
+"""
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from predictors.compiled import VERIFY_DATA
+from predictors.registry import MODELS
+from predictors.server import SERVER_HOST, SERVER_PORT, latency_stats
+from rag.serving import JsonClient
+
+
+def sample_rows(data, features, n, seed=0):
+    frame = pd.read_csv(data, usecols=list(features))
+    records = frame.to_dict("records")
+    rng = random.Random(seed)
+    return [rng.choice(records) for _ in range(n)]
+
+
+def run_load(url, names, requests, concurrency, data=VERIFY_DATA):
+    client = JsonClient(url)
+    work = []
+    for i, row in enumerate(sample_rows(data, sorted({f for n in names for f in MODELS[n].features}), requests)):
+        name = names[i % len(names)]
+        work.append((name, {"rows": [{f: row[f] for f in MODELS[name].features}]}))
+
+    def call(item):
+        name, payload = item
+        started = time.perf_counter()
+        try:
+            client.post(f"/predict/{name}", payload)
+        except RuntimeError:
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(call, work))
+    elapsed = time.perf_counter() - started
+    ok = [s for s in latencies if s is not None]
+    return {
+        "requests": requests,
+        "errors": requests - len(ok),
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests_per_s": len(ok) / elapsed if elapsed else 0.0,
+        "client_latency": latency_stats(ok),
+        "server_latency": client.get("/latency"),
+        "server_batching": {name: info["batching"] for name, info in client.get("/health")["models"].items()
+                            if name in names},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test a local prediction server.")
+    parser.add_argument("--url", default=f"http://{SERVER_HOST}:{SERVER_PORT}")
+    parser.add_argument("--model", nargs="+", choices=list(MODELS), default=list(MODELS),
+                        help="models to spread requests over")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--data", default=VERIFY_DATA, help="CSV the request rows are drawn from")
+    args = parser.parse_args()
+    print(json.dumps(run_load(args.url, args.model, args.requests, args.concurrency, args.data), indent=2))
@@ -0,0 +1,387 @@
+"""One process-wide registry for the pickled tabular pipelines.
+
+Each page used to unpickle its model at import time, so every widget
+interaction re-read and re-deserialised the file. The registry loads each
+artifact lazily, once per process (Streamlit keeps imported modules, so all
+sessions and pages share it), and records what was loaded:
+
+    sha256 / version     content hash of the file (version is its prefix)
+    load_seconds         time spent unpickling
+    bytes                approximate in-memory size of the pipeline
+    library_versions     scikit-learn / xgboost versions it runs under
+    trained_with         scikit-learn version the artifact was pickled with
+
+Files are re-checked at most every ``PREDICTORS_CHECK_SECONDS``; when one
+changes (new mtime or size, then a different hash) the model is reloaded
+and swapped in. A reload that fails keeps serving the previous model.
+
+Predictions go through an LRU cache keyed on the feature tuple
+(``PREDICTORS_CACHE_SIZE`` entries per model), since students submit the
+same small discrete inputs over and over. Models whose inputs are all
+categorical and few enough (``PREDICTORS_TABLE_LIMIT``) are tabulated for
+every possible input at load instead. Both belong to the loaded artifact,
+so a reload discards them::
+
+    python -m predictors.registry    # load every model, print its stats
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+import warnings
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from common.cache import LRUCache
+
+MODEL_DIR = os.environ.get("PREDICTORS_MODEL_DIR", ".")
+CHECK_SECONDS = float(os.environ.get("PREDICTORS_CHECK_SECONDS", "2"))
+# Predictions memoised per model; 0 disables
+CACHE_SIZE = int(os.environ.get("PREDICTORS_CACHE_SIZE", "4096"))
+# All-categorical models with at most this many input combinations are tabulated at load
+TABLE_LIMIT = int(os.environ.get("PREDICTORS_TABLE_LIMIT", "4096"))
+
+# ``features`` are the input columns, in the order the pipeline was fitted on
+ModelSpec = namedtuple("ModelSpec", "name path features")
+
+MODELS = {
+    "assessment": ModelSpec("assessment", "Assesment score.pkl", (
+        "Age", "Gender", "Parental_Education_Level", "Earning Class", "Level",
+        "Course Level", "Material Level", "Previous_Scores", "IQ", "Attendance", "Study Time",
+    )),
+    "promotion": ModelSpec("promotion", "promotion.pkl", (
+        "Age", "Parental_Education_Level", "Earning Class", "Level",
+        "Course Level", "Material Level", "Previous_Scores", "Assesment Score",
+        "IQ", "Attendance", "Study Time",
+    )),
+    "recommendation": ModelSpec("recommendation", "recomendation.pkl", (
+        "Age", "Level", "Course Level", "Material Level", "Previous_Scores",
+        "Assesment Score", "IQ", "Attendance", "Study Time",
+    )),
+    # Fitted on an unnamed single-column frame
+    "retention": ModelSpec("retention", "skipRetention.pkl", ("Level",)),
+}
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_state(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def approximate_bytes(obj):
+    """Rough in-memory size: numpy buffers plus Python objects, each counted once.
+
+    Objects are measured through ``__getstate__``, which is how extension
+    types (scikit-learn trees, xgboost boosters) expose the data they keep
+    outside ``__dict__``.
+    """
+    # Keyed by id, holding a reference so temporary states keep their ids
+    seen, total, stack = {}, 0, [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen[id(item)] = item
+        if isinstance(item, np.ndarray):
+            total += item.nbytes
+            if item.dtype == object:
+                stack.extend(item.ravel().tolist())
+            continue
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif not isinstance(item, (str, bytes, bytearray, int, float, complex, bool, type(None), type)):
+            try:
+                state = item.__getstate__()
+            except Exception:
+                state = getattr(item, "__dict__", None)
+            if state is not None:
+                stack.append(state)
+    return total
+
+
+def input_categories(spec, pipeline):
+    """``{feature: allowed values}`` for every categorical input of ``pipeline``.
+
+    Read from the fitted encoders; the pipelines were fitted with
+    ``handle_unknown="error"``, so any other value makes ``predict`` raise.
+    """
+    first = pipeline.steps[0][1]
+    if hasattr(first, "transformers_"):
+        encoders = [(t, cols) for _, t, cols in first.transformers_ if hasattr(t, "categories_")]
+    else:
+        encoders = [(first, range(len(first.categories_)))]
+    categories = {}
+    for encoder, columns in encoders:
+        for column, values in zip(columns, encoder.categories_):
+            feature = spec.features[column] if isinstance(column, int) else column
+            categories[feature] = frozenset(values.tolist())
+    return categories
+
+
+def input_space(spec, categories):
+    """Number of distinct inputs, or None if any feature is numeric."""
+    if any(f not in categories for f in spec.features):
+        return None
+    size = 1
+    for f in spec.features:
+        size *= len(categories[f])
+    return size
+
+
+def canonical_row(row):
+    # numpy scalars as Python values; 6 and 6.0 already hash and compare equal
+    return tuple(v.item() if hasattr(v, "item") else v for v in row)
+
+
+def library_versions():
+    versions = {}
+    for module in ("sklearn", "xgboost", "numpy"):
+        if module in sys.modules:
+            versions[module] = getattr(sys.modules[module], "__version__", "?")
+    return versions
+
+
+def unpickle_pipeline(f):
+    """The pipeline pickled in ``f`` and the scikit-learn version it was pickled with."""
+    import sklearn
+
+    try:
+        from sklearn.exceptions import InconsistentVersionWarning
+    except ImportError:
+        # scikit-learn < 1.3 doesn't say which version it was
+        return pickle.load(f), None
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", InconsistentVersionWarning)
+        pipeline = pickle.load(f)
+    trained_with = sklearn.__version__
+    for w in caught:
+        if isinstance(w.message, InconsistentVersionWarning):
+            trained_with = w.message.original_sklearn_version
+        else:
+            warnings.warn_explicit(w.message, w.category, w.filename, w.lineno)
+    return pipeline, trained_with
+
+
+_MISSING = object()
+
+
+class LoadedModel:
+    def __init__(self, spec, path, pipeline, sha256, file_state, load_seconds, trained_with=None):
+        self.spec = spec
+        self.path = path
+        self.pipeline = pipeline
+        self.sha256 = sha256
+        self.file_state = file_state
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.bytes = approximate_bytes(pipeline)
+        self.library_versions = library_versions()
+        self.trained_with = trained_with
+        # Predictions from another scikit-learn version may differ or fail
+        self.version_mismatch = trained_with is not None and trained_with != self.library_versions.get("sklearn")
+        self.categories = input_categories(spec, pipeline)
+        self.named_inputs = hasattr(pipeline.steps[0][1], "feature_names_in_")
+        self.compile_error = None
+        self._compiled = None
+        # One cache per loaded artifact: a reload starts from an empty one
+        self.cache = LRUCache(CACHE_SIZE, ttl=0)
+        size = input_space(spec, self.categories)
+        self.tabulated = size is not None and size <= TABLE_LIMIT
+        if self.tabulated:
+            self.compiled()
+
+    def frame(self, data):
+        """The columns of ``data`` this pipeline takes, in the order and naming it was fitted with."""
+        columns = data[list(self.spec.features)]
+        return columns if self.named_inputs else columns.set_axis(range(len(self.spec.features)), axis=1)
+
+    def compiled(self):
+        """The NumPy-only ``predictors.compiled`` form, or None if this pipeline can't be compiled."""
+        if self._compiled is None:
+            from predictors.compiled import compile_model
+
+            try:
+                self._compiled = compile_model(self)
+            except TypeError as e:
+                self.compile_error = str(e)
+                self._compiled = False
+        return self._compiled or None
+
+    def _predict_rows(self, rows):
+        compiled = self.compiled()
+        if compiled is not None:
+            return compiled.predict_rows(rows)
+        import pandas as pd
+
+        return self.pipeline.predict(self.frame(pd.DataFrame(rows, columns=list(self.spec.features))))
+
+    def predict(self, data):
+        """Predictions for a DataFrame holding the ``spec.features`` columns."""
+        return self.predict_rows(list(zip(*(data[f].tolist() for f in self.spec.features))))
+
+    def predict_rows(self, rows):
+        """Predictions for value tuples in ``spec.features`` order.
+
+        Rows seen before come from the LRU cache; the rest are predicted in
+        one call. Tabulated models skip the cache, their lookup is as cheap.
+        """
+        if self.tabulated or not self.cache.maxsize:
+            return self._predict_rows(rows)
+        keys = [canonical_row(row) for row in rows]
+        results = [self.cache.get(key, _MISSING) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is _MISSING]
+        if missing:
+            for i, result in zip(missing, self._predict_rows([rows[i] for i in missing])):
+                results[i] = result
+                self.cache.put(keys[i], result)
+        return np.asarray(results)
+
+    @property
+    def version(self):
+        return self.sha256[:12]
+
+    def as_dict(self):
+        return {
+            "name": self.spec.name,
+            "path": self.path,
+            "version": self.version,
+            "sha256": self.sha256,
+            "load_seconds": self.load_seconds,
+            "loaded_at": self.loaded_at,
+            "bytes": self.bytes,
+            "library_versions": self.library_versions,
+            "trained_with": self.trained_with,
+            "version_mismatch": self.version_mismatch,
+            "compiled": self._compiled.kind if self._compiled else None,
+            "compile_error": self.compile_error,
+            "tabulated": self.tabulated,
+            "cache": self.cache.stats(),
+        }
+
+
+class _Entry:
+    def __init__(self, spec):
+        self.spec = spec
+        self.lock = threading.Lock()
+        self.model = None
+        self.checked_at = 0.0
+        self.reloads = 0
+        self.error = None
+
+
+class ModelRegistry:
+    def __init__(self, specs=None, model_dir=MODEL_DIR, check_seconds=CHECK_SECONDS):
+        specs = specs if specs is not None else MODELS
+        self.model_dir = model_dir
+        self.check_seconds = check_seconds
+        self._entries = {name: _Entry(spec) for name, spec in specs.items()}
+
+    def path(self, name):
+        return os.path.join(self.model_dir, self._entries[name].spec.path)
+
+    def _load(self, entry, path, sha256, state):
+        started = time.perf_counter()
+        with open(path, "rb") as f:
+            pipeline, trained_with = unpickle_pipeline(f)
+        return LoadedModel(entry.spec, path, pipeline, sha256, state, time.perf_counter() - started, trained_with)
+
+    def _refresh(self, entry):
+        path = self.path(entry.spec.name)
+        current = entry.model
+        try:
+            state = _file_state(path)
+            if current is not None and state == current.file_state:
+                return
+            sha256 = file_hash(path)
+            if current is not None and sha256 == current.sha256:
+                # Touched but not changed
+                current.file_state = state
+                return
+            entry.model = self._load(entry, path, sha256, state)
+        except Exception as e:
+            if current is None:
+                raise
+            # Keep serving the model we have
+            entry.error = f"reload of {path} failed: {type(e).__name__}: {e}"
+            return
+        entry.error = None
+        if current is not None:
+            entry.reloads += 1
+
+    def loaded(self, name):
+        """The ``LoadedModel`` for ``name``, loading or reloading it if needed."""
+        entry = self._entries[name]
+        now = time.monotonic()
+        if entry.model is None or now - entry.checked_at >= self.check_seconds:
+            with entry.lock:
+                if entry.model is None or now - entry.checked_at >= self.check_seconds:
+                    self._refresh(entry)
+                    entry.checked_at = time.monotonic()
+        return entry.model
+
+    def get(self, name):
+        """The pipeline itself."""
+        return self.loaded(name).pipeline
+
+    def names(self):
+        return list(self._entries)
+
+    def stats(self):
+        """Per model: load statistics if loaded, plus reload count and last error."""
+        report = {}
+        for name, entry in self._entries.items():
+            info = entry.model.as_dict() if entry.model is not None else {"name": name, "path": self.path(name)}
+            info.update(loaded=entry.model is not None, reloads=entry.reloads, error=entry.error)
+            report[name] = info
+        return report
+
+
+@lru_cache(maxsize=None)
+def get_registry():
+    """The process-wide registry: pages call ``get_registry().loaded(name)`` at
+    the top level, so every session shares one load and sees hot reloads."""
+    return ModelRegistry()
+
+
+def describe(model):
+    """One line for a page caption."""
+    line = (f"Model `{os.path.basename(model.path)}` v{model.version}: "
+            f"loaded in {model.load_seconds:.2f} s, ~{model.bytes / 2 ** 20:.1f} MiB")
+    if model.tabulated:
+        return line + ", every input precomputed"
+    cache = model.cache.stats()
+    return line + f", {cache['hits']} cached / {cache['misses']} computed predictions"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the prediction pipelines and report their cost.")
+    parser.add_argument("names", nargs="*", help=f"any of {', '.join(MODELS)} (default: all)")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    args = parser.parse_args()
+    unknown = set(args.names) - set(MODELS)
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(sorted(unknown))}")
+
+    registry = ModelRegistry(model_dir=args.model_dir)
+    for name in args.names or registry.names():
+        registry.loaded(name)
+    print(json.dumps({name: info for name, info in registry.stats().items()
+                      if not args.names or name in args.names}, indent=2))
@@ -0,0 +1,147 @@
+"""Local JSON prediction API for the four tabular models.
+
+Lets services outside Streamlit (LMS sync, nightly reports) use the same
+models as the pages. Built on ``rag.serving``: concurrent requests for a
+model are grouped by a ``MicroBatcher`` into one vectorised predict call
+(through the registry, so the compiled predictor, the prediction cache
+and hot reloading all apply), and each model admits at most
+``--max-in-flight`` rows at a time, answering 503 beyond that::
+
+    python -m predictors.server [--port 8766] [--max-batch 64] [--max-wait-ms 2] [--max-in-flight 1024]
+    python -m predictors.loadtest --model promotion --concurrency 32
+
+Endpoints (JSON in and out):
+
+    POST /predict/<model>  {"rows": [{feature: value, ...}, ...]}  -> {"model", "version", "predictions"}
+    GET  /health           model versions, batching and in-flight counts
+    GET  /latency          per model p50/p95/p99 of recent requests
+
+``<model>`` is one of assessment, promotion, recommendation, retention;
+``GET /health`` lists each model's features.
+"""
+import argparse
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+
+from predictors.registry import MODELS, get_registry
+from rag.serving import HttpError, MicroBatcher, serve_json
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8766
+MAX_BATCH = 64
+MAX_WAIT_MS = 2.0
+MAX_IN_FLIGHT = 1024
+# Requests per model kept for /latency
+LATENCY_WINDOW = 2048
+
+
+def latency_stats(seconds):
+    if not len(seconds):
+        return {"requests": 0}
+    ms = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"requests": len(ms), "mean_ms": float(ms.mean()), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+
+def row_values(model, row):
+    """A request row as a value tuple in feature order; bad rows are rejected before batching."""
+    if not isinstance(row, dict):
+        raise ValueError("each row must be an object of feature values")
+    missing = [f for f in model.spec.features if f not in row]
+    if missing:
+        raise ValueError(f"row is missing {', '.join(missing)}")
+    values = []
+    for feature in model.spec.features:
+        value = row[feature]
+        allowed = model.categories.get(feature)
+        if allowed is not None:
+            if value not in allowed:
+                raise ValueError(f"{feature} must be one of {sorted(allowed)}, got {value!r}")
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{feature} must be a number, got {value!r}")
+        values.append(value)
+    return tuple(values)
+
+
+class ModelEndpoint:
+    def __init__(self, name, registry, max_batch, max_wait_ms, max_in_flight):
+        self.name = name
+        self.registry = registry
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.batcher = MicroBatcher(self._predict_batch, max_batch, max_wait_ms, name)
+
+    def _predict_batch(self, rows):
+        return list(self.registry.loaded(self.name).predict_rows(rows))
+
+    async def predict(self, payload):
+        started = time.perf_counter()
+        model = self.registry.loaded(self.name)
+        rows = payload["rows"] if "rows" in payload else [payload["row"]]
+        values = [row_values(model, row) for row in rows]
+        if self.in_flight + len(values) > self.max_in_flight:
+            self.rejected += 1
+            raise HttpError(503, f"{self.name} has {self.in_flight} rows in flight, try again shortly")
+        self.in_flight += len(values)
+        try:
+            predictions = await self.batcher.submit_many(values)
+        finally:
+            self.in_flight -= len(values)
+        self.latencies.append(time.perf_counter() - started)
+        return {"model": self.name, "version": model.version, "predictions": predictions}
+
+    def health(self):
+        info = self.registry.stats()[self.name]
+        return {
+            "version": info.get("version"),
+            "features": list(MODELS[self.name].features),
+            "compiled": info.get("compiled"),
+            "tabulated": info.get("tabulated"),
+            "cache": info.get("cache"),
+            "reloads": info["reloads"],
+            "error": info["error"],
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "rejected": self.rejected,
+            "batching": self.batcher.stats(),
+        }
+
+
+async def serve(host=SERVER_HOST, port=SERVER_PORT, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS,
+                max_in_flight=MAX_IN_FLIGHT, registry=None):
+    registry = registry or get_registry()
+    endpoints = {}
+    for name in registry.names():
+        # Load (and compile) up front so the first requests don't pay for it
+        registry.loaded(name).compiled()
+        endpoints[name] = ModelEndpoint(name, registry, max_batch, max_wait_ms, max_in_flight)
+        endpoints[name].batcher.start()
+
+    async def health(_):
+        return {"status": "ok", "models": {name: e.health() for name, e in endpoints.items()}}
+
+    async def latency(_):
+        return {name: latency_stats(e.latencies) for name, e in endpoints.items()}
+
+    routes = {("GET", "/health"): health, ("GET", "/latency"): latency}
+    for name, endpoint in endpoints.items():
+        routes[("POST", f"/predict/{name}")] = endpoint.predict
+    print(f"Serving {', '.join(endpoints)} on http://{host}:{port} "
+          f"(batch <= {max_batch}, wait <= {max_wait_ms} ms, in flight <= {max_in_flight})")
+    await serve_json(routes, host, port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the tabular prediction models over HTTP.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT, help="rows per model")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.max_batch, args.max_wait_ms, args.max_in_flight))
@@ -0,0 +1 @@
+"""Retrieval helpers shared by the PdfQuery page and its command-line tools."""
@@ -0,0 +1,148 @@
+"""Approximate nearest-neighbour index types for large corpora.
+
+``flat`` is exact brute force and is what small corpora use: the corpus
+searches the vector file directly. Past a few tens of thousands of chunks
+``auto`` switches to HNSW, then IVF-Flat, then IVF-PQ (compressed codes) as
+the corpus grows. Every ANN build is checked against the flat baseline and
+the measured recall@k and per-query latency are returned as a report.
+
+    python -m rag.ann [--type auto|flat|hnsw|ivf|ivfpq]   # rebuild the corpus index
+"""
+import argparse
+import math
+import os
+import time
+
+import faiss
+import numpy as np
+
+INDEX_TYPE = os.environ.get("PDFQUERY_INDEX_TYPE", "auto")
+INDEX_TYPES = ("auto", "flat", "hnsw", "ivf", "ivfpq")
+
+FLAT_MAX = 20_000
+HNSW_MAX = 200_000
+IVF_MAX = 2_000_000
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+PQ_BITS = 8
+ADD_BATCH = 65_536
+RECALL_K = 10
+RECALL_QUERIES = 200
+# faiss wants ~39 training points per centroid: fewer vectors than this
+# cannot train even one IVF list, or the 2**PQ_BITS centroids of a PQ codebook
+IVF_MIN = 39
+IVFPQ_MIN = 2 ** PQ_BITS * 39
+
+
+def choose_index_type(count, requested=None):
+    """Index type for ``count`` vectors.
+
+    An explicit type is honoured as far as ``count`` can train it: IVF-PQ
+    falls back to IVF-Flat, and IVF-Flat to flat, on too few vectors.
+    """
+    requested = requested or INDEX_TYPE
+    if requested not in INDEX_TYPES:
+        raise ValueError(f"unknown index type {requested!r}, expected one of {INDEX_TYPES}")
+    if requested != "auto":
+        if requested == "ivfpq" and count < IVFPQ_MIN:
+            requested = "ivf"
+        if requested == "ivf" and count < IVF_MIN:
+            requested = "flat"
+        return requested
+    if count <= FLAT_MAX:
+        return "flat"
+    if count <= HNSW_MAX:
+        return "hnsw"
+    if count <= IVF_MAX:
+        return "ivf"
+    return "ivfpq"
+
+
+def _nlist(count):
+    # faiss wants ~39 training points per centroid; 4*sqrt(n) lists otherwise
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+
+def _pq_subquantizers(dim):
+    # Largest divisor of dim giving sub-vectors of at least 8 dimensions
+    for m in range(dim // 8, 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _training_sample(vectors, n_train, seed=0):
+    if len(vectors) <= n_train:
+        return np.ascontiguousarray(vectors, dtype="float32")
+    rows = np.sort(np.random.default_rng(seed).choice(len(vectors), n_train, replace=False))
+    return np.ascontiguousarray(vectors[rows], dtype="float32")
+
+
+def build_index(vectors, index_type=None):
+    """Build the requested (or size-appropriate) index over ``vectors``.
+
+    Returns None for ``flat``: the corpus searches the vector file itself.
+    ``vectors`` may be a memmap; rows are added in batches to bound memory.
+    """
+    count, dim = vectors.shape
+    index_type = choose_index_type(count, index_type)
+    if index_type == "flat" or count == 0:
+        return None
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    else:
+        nlist = _nlist(count)
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), PQ_BITS)
+        index.train(_training_sample(vectors, max(256 * nlist, 2 ** PQ_BITS * 39)))
+        index.nprobe = min(IVF_NPROBE, nlist)
+
+    for start in range(0, count, ADD_BATCH):
+        index.add(np.ascontiguousarray(vectors[start:start + ADD_BATCH], dtype="float32"))
+    return index
+
+
+def recall_report(index, vectors, k=RECALL_K, n_queries=RECALL_QUERIES, seed=0):
+    """Recall@k of ``index`` against exact search, using stored vectors as queries."""
+    count = len(vectors)
+    k = min(k, count)
+    report = {"type": type(index).__name__ if index is not None else "flat", "count": count, "k": k}
+    if index is None or k == 0:
+        report["recall_at_k"] = 1.0
+        return report
+
+    queries = _training_sample(vectors, n_queries, seed)
+    started = time.perf_counter()
+    _, exact = faiss.knn(queries, np.ascontiguousarray(vectors), k)
+    report["flat_ms_per_query"] = (time.perf_counter() - started) * 1000 / len(queries)
+
+    started = time.perf_counter()
+    _, approx = index.search(queries, k)
+    report["ann_ms_per_query"] = (time.perf_counter() - started) * 1000 / len(queries)
+
+    found = sum(len(set(a[a >= 0]) & set(e)) for a, e in zip(approx, exact))
+    report["recall_at_k"] = found / (len(queries) * k)
+    return report
+
+
+if __name__ == "__main__":
+    from rag.corpus import build_corpus
+
+    parser = argparse.ArgumentParser(description="Rebuild the corpus index and report recall against flat search.")
+    parser.add_argument("--type", choices=INDEX_TYPES, default=None,
+                        help=f"kept for later builds (default: PDFQUERY_INDEX_TYPE, now {INDEX_TYPE})")
+    args = parser.parse_args()
+
+    meta = build_corpus(index_type=args.type)
+    print(f"{meta['count']} chunks from {len(meta['documents'])} document(s)")
+    for key, value in meta["ann"].items():
+        print(f"  {key}: {value:.4f}" if isinstance(value, float) else f"  {key}: {value}")
@@ -0,0 +1,294 @@
+"""Stage-by-stage benchmark of the PdfQuery pipeline.
+
+Indexes a set of PDFs into a scratch store (never the app's ``indices/``),
+then asks a fixed set of questions, timing every stage separately:
+
+    extract   PDF page -> text               (per page)
+    split     page text -> chunks            (per page)
+    encode    chunk batch -> embeddings      (per batch)
+    store     BM25 build and write           (per document)
+    search    dense + BM25 + fusion          (per question)
+    rerank    cross-encoder over candidates  (per reranked question)
+    qa        batched extractive QA          (per question)
+
+Questions go through the app's own ``answer_query`` with the default
+cascade, and the search/rerank/qa times are read from its trace, so the
+benchmark measures exactly what a user waits for (including reranks the
+cascade skips, which are counted under ``rerank_decisions``).
+
+Results (throughput, p50/p95/p99 latency, peak RSS, index size on disk) are
+written as JSON; ``--baseline`` compares against an earlier run and exits
+non-zero on a regression::
+
+    python -m rag.bench --synthetic 20 200 --out bench.json
+    python -m rag.bench --pdf temp_*.pdf --baseline bench.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+from rag.extract import iter_pages
+from rag.indexing import EMBED_BATCH, batched, iter_chunks
+from rag.lexical import build_lexical
+from rag.models import BACKEND, BACKENDS, SAMPLE_QUESTIONS, lazy_models, timed
+from rag.retrieval import DEFAULT_CASCADE, answer_query
+from rag.store import INDEX_DIR, directory_size, save_index
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+QUESTIONS = SAMPLE_QUESTIONS + [
+    "How is the area of a circle calculated?",
+    "What causes the seasons on Earth?",
+    "Explain the water cycle.",
+    "What is the difference between speed and velocity?",
+]
+STAGES = ("extract", "split", "encode", "store", "search", "rerank", "qa")
+UNITS = {"extract": "pages", "split": "pages", "encode": "chunks", "store": "documents",
+         "search": "questions", "rerank": "questions", "qa": "questions"}
+# A stage's p50 may grow this much over the baseline before it counts as a regression
+REGRESSION_TOLERANCE = 0.2
+
+
+# ----------- SYNTHETIC PDFS -----------
+WORDS = (
+    "photosynthesis energy cell plant light water carbon oxygen equation force mass velocity "
+    "acceleration circle area radius triangle angle theorem proof history empire trade river "
+    "climate season earth orbit sun atom molecule reaction chapter lesson student teacher "
+    "example exercise answer question definition property number fraction decimal percent"
+).split()
+
+
+def _sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_pdf(path, pages, lines_per_page=40, seed=0):
+    """Write a plain-text PDF of ``pages`` pages that PyPDF2 can extract."""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        lines = [_sentence(rng) for _ in range(lines_per_page)]
+        text = " T* ".join(f"({line}) Tj" for line in lines)
+        stream = f"BT /F1 10 Tf 14 TL 40 800 Td {text} ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref)
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+# ----------- MEASUREMENT -----------
+class Timings:
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.items = {stage: 0 for stage in STAGES}
+
+    def add(self, stage, seconds, items=1):
+        self.samples[stage].append(seconds)
+        self.items[stage] += items
+
+    def time(self, stage, fn, items=1):
+        result, ms = timed(fn)
+        self.add(stage, ms / 1000, items)
+        return result
+
+    def report(self):
+        report = {}
+        for stage in STAGES:
+            samples = np.asarray(self.samples[stage]) * 1000
+            if not len(samples):
+                continue
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            total = samples.sum() / 1000
+            report[stage] = {
+                "calls": len(samples),
+                "items": self.items[stage],
+                "unit": UNITS[stage],
+                "total_s": total,
+                "throughput_per_s": self.items[stage] / total if total else None,
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+            }
+        return report
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and its children (None if unknown)."""
+    if resource is None:
+        try:
+            import psutil
+        except ImportError:
+            return {"self": None, "children": None}
+        # Peak working set; Windows keeps no figure for finished children
+        return {"self": psutil.Process().memory_info().peak_wset / 2 ** 20, "children": None}
+    # ru_maxrss is KiB on Linux, bytes on macOS; children covers extraction pools
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return {"self": own / 2 ** 20, "children": children / 2 ** 20}
+
+
+# ----------- BENCHMARK -----------
+def index_timed(doc_id, path, encoder, timings, batch_size=EMBED_BATCH, workers=None):
+    """``index_document`` split into individually timed stages."""
+    pages, page_iter = [], iter_pages(path, workers)
+    while True:
+        started = time.perf_counter()
+        page = next(page_iter, None)
+        if page is None:
+            break
+        timings.add("extract", time.perf_counter() - started)
+        pages.append(page)
+
+    chunks = []
+    for page in pages:
+        chunks.extend(timings.time("split", lambda: list(iter_chunks([page]))))
+
+    vectors = []
+    for batch in batched([text for _, text in chunks], batch_size):
+        vectors.append(timings.time("encode", lambda: encoder.encode(batch, batch_size=batch_size), len(batch)))
+    dim = encoder.get_sentence_embedding_dimension()
+    embeddings = np.concatenate(vectors).astype("float32") if vectors else np.zeros((0, dim), "float32")
+
+    def store():
+        texts = [text for _, text in chunks]
+        return save_index(doc_id, embeddings, texts, [p for p, _ in chunks],
+                          lexical=build_lexical(texts), source=os.path.basename(path))
+
+    timings.time("store", store)
+    return {"doc_id": doc_id, "source": os.path.basename(path), "pages": len(pages), "chunks": len(chunks)}
+
+
+def query_timed(corpus, encoder, reranker, qa_pipeline, question, timings, cascade=DEFAULT_CASCADE):
+    """Answer ``question`` with ``answer_query`` and file its trace under the query stages."""
+    _, _, _, trace = answer_query(question, corpus, encoder, reranker, qa_pipeline, cascade=cascade)
+    rerank_ms = trace.get("rerank_ms", 0.0)
+    timings.add("search", trace["search_ms"] / 1000)
+    if "rerank_ms" in trace:
+        timings.add("rerank", rerank_ms / 1000)
+    timings.add("qa", (trace["total_ms"] - trace["search_ms"] - rerank_ms) / 1000)
+    return trace
+
+
+def run_benchmark(pdfs, backend=BACKEND, repeat=3, batch_size=EMBED_BATCH, workers=None):
+    """Index ``pdfs`` into the store under the current directory and query it."""
+    from rag.corpus import open_corpus
+
+    encoder, reranker, qa_pipeline = lazy_models(backend)
+    started = time.perf_counter()
+    for model in (encoder, reranker, qa_pipeline):
+        model.get()
+    load_s = time.perf_counter() - started
+
+    timings = Timings()
+    documents = [index_timed(f"bench{i:04d}", path, encoder, timings, batch_size, workers)
+                 for i, path in enumerate(pdfs)]
+    corpus = open_corpus()
+    decisions = Counter()
+    for _ in range(repeat):
+        for question in QUESTIONS:
+            trace = query_timed(corpus, encoder, reranker, qa_pipeline, question, timings)
+            decisions[trace.get("rerank", "no candidates")] += 1
+
+    return {
+        "created_at": time.time(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "backend": backend,
+            "embed_batch": batch_size,
+        },
+        "documents": documents,
+        "questions": len(QUESTIONS) * repeat,
+        "model_load_s": load_s,
+        "stages": timings.report(),
+        "rerank_decisions": dict(decisions),
+        "peak_rss_mb": peak_rss_mb(),
+        "index_bytes": directory_size(INDEX_DIR),
+        "index_type": corpus.meta["index_type"],
+    }
+
+
+def compare(result, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Stages whose p50 latency grew by more than ``tolerance`` over ``baseline``."""
+    regressions = {}
+    for stage, stats in result["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if before and before["p50_ms"] and stats["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions[stage] = {"baseline_p50_ms": before["p50_ms"], "p50_ms": stats["p50_ms"]}
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every PdfQuery stage and save the results as JSON.")
+    parser.add_argument("--pdf", nargs="*", default=None, help="PDFs to index (default: temp_*.pdf)")
+    parser.add_argument("--synthetic", nargs="*", type=int, default=None, metavar="PAGES",
+                        help="generate one synthetic PDF per page count instead")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the question set")
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND)
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH)
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes")
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--baseline", default=None, help="earlier result to check for regressions")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    pdfs = [os.path.abspath(p) for p in (args.pdf or glob.glob("temp_*.pdf"))]
+
+    with tempfile.TemporaryDirectory(prefix="pdfquery-bench-") as scratch:
+        if args.synthetic:
+            pdfs = [synthetic_pdf(os.path.join(scratch, f"synthetic_{n}p.pdf"), n, seed=n) for n in args.synthetic]
+        if not pdfs:
+            parser.error("no PDFs: pass --pdf or --synthetic")
+        # The scratch dir becomes the working directory so indices/ there is a
+        # throwaway store, never the app's
+        os.chdir(scratch)
+        result = run_benchmark(pdfs, args.backend, args.repeat, args.batch_size, args.workers)
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    for stage, stats in result["stages"].items():
+        print(f"{stage:8s} {stats['throughput_per_s'] or 0:10.1f} {stats['unit']}/s   "
+              f"p50 {stats['p50_ms']:8.2f} ms   p95 {stats['p95_ms']:8.2f} ms   p99 {stats['p99_ms']:8.2f} ms")
+    rss = result["peak_rss_mb"]["self"]
+    print(f"peak RSS {f'{rss:.0f} MiB' if rss is not None else 'unknown'}, "
+          f"index {result['index_bytes'] / 2 ** 20:.1f} MiB -> {out}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f))
+        for stage, change in regressions.items():
+            print(f"REGRESSION {stage}: p50 {change['baseline_p50_ms']:.2f} -> {change['p50_ms']:.2f} ms")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,47 @@
+"""In-process caches for repeated questions.
+
+Classrooms ask the same question many times within minutes, so PdfQuery
+keeps the query embedding (keyed on the normalised query alone) and the
+retrieved hits plus final answer (keyed on the searched documents and the
+normalised query). Documents enter the key as ``(doc_id, indexed_at)``
+pairs: re-indexing a document changes its ``indexed_at`` and so every
+cached answer that searched it stops matching.
+"""
+import os
+import re
+
+from common.cache import LRUCache
+
+CACHE_SIZE = int(os.environ.get("PDFQUERY_CACHE_SIZE", "2048"))
+CACHE_TTL = float(os.environ.get("PDFQUERY_CACHE_TTL", "3600"))
+
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!. ").lower()
+
+
+class QueryCache:
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.embeddings = LRUCache(maxsize, ttl)
+        self.answers = LRUCache(maxsize, ttl)
+
+    def embedding(self, query, encode):
+        """Return the cached embedding of ``query`` or compute it with ``encode()``."""
+        key = normalize_query(query)
+        emb = self.embeddings.get(key)
+        if emb is None:
+            emb = encode()
+            self.embeddings.put(key, emb)
+        return emb
+
+    def get_answer(self, scope, query):
+        return self.answers.get((scope, normalize_query(query)))
+
+    def put_answer(self, scope, query, hits, answer, context):
+        self.answers.put((scope, normalize_query(query)), (hits, answer, context))
+
+    def invalidate_document(self, doc_id):
+        self.answers.discard_if(lambda key: any(d == doc_id for d, _ in key[0]))
+
+    def stats(self):
+        return {"embeddings": self.embeddings.stats(), "answers": self.answers.stats()}
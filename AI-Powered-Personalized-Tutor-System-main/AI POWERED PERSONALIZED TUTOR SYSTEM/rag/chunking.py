@@ -0,0 +1,154 @@
+"""Token-aware chunking sized to the model windows.
+
+Character-based chunks (the old 500/100 splitter) overflow MiniLM's
+256-token window on dense text, and are silently truncated, yet are far
+too short on sparse pages, which wastes forward passes. This chunker
+tokenises each page once with the encoder's tokenizer and cuts at
+sentence boundaries so every chunk holds at most ``CHUNK_TOKENS`` tokens,
+the tightest of the three windows:
+
+    encoder   all-MiniLM-L6-v2            256 tokens, 2 special
+    reranker  ms-marco-MiniLM-L-6-v2      512 tokens, 3 special + question
+    qa        roberta-base-squad2         384 tokens, 4 special + question
+
+``ChunkStats`` counts, per window, the tokens truncated (over the window)
+and wasted (window left empty) by the chunks actually stored; the totals
+go into the document's ``meta.json``::
+
+    python -m rag.chunking some.pdf    # compare with the character splitter
+"""
+import argparse
+import json
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from rag.models import ENCODER_MODEL, QA_MODEL, RERANKER_MODEL
+
+# Room left for the question in the reranker and QA inputs
+QUESTION_TOKENS = 64
+WINDOWS = {
+    "encoder": (ENCODER_MODEL, 256 - 2),
+    "reranker": (RERANKER_MODEL, 512 - 3 - QUESTION_TOKENS),
+    "qa": (QA_MODEL, 384 - 4 - QUESTION_TOKENS),
+}
+CHUNK_TOKENS = int(os.environ.get("PDFQUERY_CHUNK_TOKENS", str(min(limit for _, limit in WINDOWS.values()))))
+OVERLAP_TOKENS = 32
+
+# A new sentence (or line) starts at the end of each match
+_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+|\n\s*")
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model_id):
+    from transformers import AutoTokenizer
+
+    # sentence-transformers models are published under that organisation
+    return AutoTokenizer.from_pretrained(model_id if "/" in model_id else f"sentence-transformers/{model_id}")
+
+
+def token_counts(texts, model_id):
+    if not texts:
+        return np.zeros(0, dtype="int64")
+    ids = get_tokenizer(model_id)(list(texts), add_special_tokens=False, verbose=False)["input_ids"]
+    return np.array([len(i) for i in ids], dtype="int64")
+
+
+class TokenChunker:
+    def __init__(self, model_id=ENCODER_MODEL, max_tokens=CHUNK_TOKENS, overlap=OVERLAP_TOKENS):
+        if max_tokens // 2 <= overlap:
+            raise ValueError(f"overlap ({overlap}) must be less than half of max_tokens ({max_tokens})")
+        self.tokenizer = get_tokenizer(model_id)
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+
+    def split(self, text):
+        """Chunks of at most ``max_tokens`` tokens, cut at sentence boundaries
+        when one falls in the second half of the window."""
+        encoded = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        offsets = encoded["offset_mapping"]
+        n = len(offsets)
+        if n == 0:
+            return []
+        starts = np.array([start for start, _ in offsets])
+        cuts = np.unique(np.searchsorted(starts, [m.end() for m in _BOUNDARY.finditer(text)]))
+
+        chunks, lo = [], 0
+        while True:
+            hi = min(lo + self.max_tokens, n)
+            if hi < n:
+                # Last sentence start in [lo + max/2, hi], else a hard cut
+                i = np.searchsorted(cuts, hi, side="right") - 1
+                if i >= 0 and cuts[i] >= lo + self.max_tokens // 2:
+                    hi = int(cuts[i])
+            chunk = text[offsets[lo][0]:offsets[hi - 1][1]].strip()
+            if chunk:
+                chunks.append(chunk)
+            if hi == n:
+                return chunks
+            # Overlap from the first sentence start in the last `overlap` tokens,
+            # always past the current start so the loop makes progress
+            floor = max(hi - self.overlap, lo + 1)
+            j = np.searchsorted(cuts, floor, side="left")
+            lo = int(cuts[j]) if j < len(cuts) and cuts[j] < hi else floor
+
+
+class ChunkStats:
+    """Per-window token accounting over the chunks of one document."""
+
+    FIELDS = ("chunks", "tokens", "truncated_chunks", "truncated_tokens", "wasted_tokens")
+
+    def __init__(self, counts=None):
+        self.counts = counts or {name: dict.fromkeys(self.FIELDS, 0) for name in WINDOWS}
+
+    def add(self, texts):
+        for name, (model_id, limit) in WINDOWS.items():
+            lengths = token_counts(texts, model_id)
+            over = np.maximum(lengths - limit, 0)
+            counts = self.counts[name]
+            counts["chunks"] += len(lengths)
+            counts["tokens"] += int(lengths.sum())
+            counts["truncated_chunks"] += int((over > 0).sum())
+            counts["truncated_tokens"] += int(over.sum())
+            counts["wasted_tokens"] += int(np.maximum(limit - lengths, 0).sum())
+
+    def report(self):
+        report = {}
+        for name, counts in self.counts.items():
+            limit = WINDOWS[name][1]
+            capacity = counts["chunks"] * limit
+            report[name] = {**counts, "window": limit,
+                            "fill": (counts["tokens"] - counts["truncated_tokens"]) / capacity if capacity else 0.0}
+        return report
+
+
+@lru_cache(maxsize=None)
+def default_chunker():
+    return TokenChunker()
+
+
+if __name__ == "__main__":
+    from rag.extract import extract_pages
+
+    parser = argparse.ArgumentParser(description="Token waste and truncation of the token chunker vs. characters.")
+    parser.add_argument("pdf")
+    parser.add_argument("--chars", type=int, default=500, help="character splitter chunk size to compare with")
+    parser.add_argument("--char-overlap", type=int, default=100)
+    args = parser.parse_args()
+
+    pages = [text for _, text in extract_pages(args.pdf)]
+    token_stats = ChunkStats()
+    token_stats.add([chunk for text in pages for chunk in default_chunker().split(text)])
+    result = {"tokens": token_stats.report()}
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    except ImportError:
+        pass
+    else:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=args.chars, chunk_overlap=args.char_overlap)
+        char_stats = ChunkStats()
+        char_stats.add([chunk for text in pages for chunk in splitter.split_text(text)])
+        result["characters"] = char_stats.report()
+    print(json.dumps(result, indent=2))
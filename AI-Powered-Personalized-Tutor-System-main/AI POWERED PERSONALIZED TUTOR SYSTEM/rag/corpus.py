@@ -0,0 +1,364 @@
+"""One search index spanning every stored document.
+
+The corpus concatenates the per-document vector files into one
+``indices/_corpus/vectors-<generation>.f32`` so a question is answered with a
+single search over the whole library. Each document owns a contiguous row range,
+recorded in ``meta.json``; a row maps back to ``(doc_id, chunk_id)`` with a
+binary search over the range starts, and chunk text and pages are read from
+the document's own store, so text is not duplicated.
+
+Large corpora also get an ANN index (``index.faiss``, see ``rag.ann``) for
+unfiltered searches. The raw vector file is kept regardless: searches
+restricted to a few documents run exactly over just their rows.
+
+The per-document BM25 indexes are merged into ``lexical.npz`` over the same
+global rows, for the lexical half of hybrid retrieval (see ``rag.lexical``).
+
+Like a document, the corpus is published as a new version with a
+``CURRENT`` pointer (see ``rag.store``), so sessions still searching the
+previous one keep their memory-mapped files until they reload. A newly
+indexed document is appended: its rows go to the end of the current vector
+file (past the rows any published version maps), the ANN index gets them
+added and a new version is published; only removals and large growth
+rebuild from scratch, into a new vector file. ``ensure_corpus`` is meant to
+run in the indexing job, not the page, and holds a lock file so the app and
+the ingest CLI never build at the same time.
+
+Per-document stores (chunk text, pages) are opened on demand. The
+``HOT_DOCS`` most recently used documents are loaded when the corpus opens
+and pinned in RAM; the rest stay memory-mapped, with at most ``OPEN_DOCS``
+kept open at a time.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+from rag.ann import ADD_BATCH, build_index, choose_index_type, recall_report
+from rag.lexical import LEXICAL_FILE, load_lexical, merge_lexical
+from rag.store import (
+    INDEX_DIR, STORE_VERSION, FileLock, document_path, ensure_lexical, last_access, list_documents, live_dir,
+    load_index, publish_dir, read_meta, record_access, remove_path,
+)
+
+CORPUS_ID = "_corpus"
+HOT_DOCS = int(os.environ.get("PDFQUERY_HOT_DOCS", "8"))
+OPEN_DOCS = int(os.environ.get("PDFQUERY_OPEN_DOCS", "32"))
+# Retrain the ANN index once the corpus doubles past what it was trained on
+REBUILD_GROWTH = 2
+
+# Whoever builds the corpus (app worker thread, ingest CLI, housekeeping)
+# holds this, so concurrent builds in different processes take turns
+_build_lock = FileLock(os.path.join(INDEX_DIR, f"{CORPUS_ID}.lock"))
+
+
+def _root():
+    return os.path.join(INDEX_DIR, CORPUS_ID)
+
+
+def read_corpus_meta():
+    """Meta of the live corpus version (with its directory as ``path``), or None."""
+    live = live_dir(_root())
+    if live is None:
+        return None
+    with open(os.path.join(live, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["path"] = live
+    return meta
+
+
+def vectors_path(meta):
+    # Corpora built before vector generations keep vectors.f32 in the version
+    if meta.get("vectors"):
+        return os.path.join(_root(), meta["vectors"])
+    return os.path.join(meta["path"], "vectors.f32")
+
+
+def _map_vectors(path, count, dim):
+    if not count:
+        return np.zeros((0, dim), dtype="float32")
+    return np.memmap(path, dtype="float32", mode="r", shape=(count, dim))
+
+
+def _staging_dir():
+    # Only ever used under _build_lock, so one fixed name is enough
+    tmp_dir = os.path.join(INDEX_DIR, f".{CORPUS_ID}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    return tmp_dir
+
+
+def _append_documents(out, doc_ids, start, dim, documents, skipped):
+    """Copy the documents' vector files to ``out`` (streamed, no decode).
+
+    Appends to ``documents``/``skipped`` and returns ``(lexical_parts, end, dim)``.
+    """
+    lexical_parts = []
+    for doc_id in doc_ids:
+        meta = read_meta(doc_id)
+        if dim is None:
+            dim = meta["dim"]
+        if meta["dim"] != dim:
+            # Built with a different encoder; cannot share a vector space
+            skipped.append(doc_id)
+            continue
+        with open(document_path(doc_id, "vectors.f32"), "rb") as src:
+            shutil.copyfileobj(src, out)
+        documents.append({
+            "id": doc_id,
+            "start": start,
+            "count": meta["count"],
+            "source": meta.get("source", doc_id),
+            "indexed_at": meta.get("indexed_at", 0),
+        })
+        lexical_parts.append((ensure_lexical(doc_id), start))
+        start += meta["count"]
+    return lexical_parts, start, dim
+
+
+def _publish(tmp_dir, lexical, meta):
+    lexical.save(os.path.join(tmp_dir, LEXICAL_FILE))
+    meta["built_at"] = time.time()
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    meta["path"] = publish_dir(_root(), tmp_dir)
+    for path in _unused_vector_files():
+        remove_path(path)
+    return meta
+
+
+def _build(doc_ids, index_type=None):
+    tmp_dir = _staging_dir()
+    os.makedirs(_root(), exist_ok=True)
+    # A full build starts a new vector file; versions appended to the old
+    # one may still be mapped by other sessions
+    name = f"vectors-{time.time_ns():x}.f32"
+    documents, skipped = [], []
+    with open(os.path.join(_root(), name), "wb") as out:
+        lexical_parts, count, dim = _append_documents(out, doc_ids, 0, None, documents, skipped)
+
+    dim = dim or 0
+    vectors = _map_vectors(os.path.join(_root(), name), count, dim)
+    kind = choose_index_type(count, index_type)
+    index = build_index(vectors, kind)
+    if index is not None:
+        faiss.write_index(index, os.path.join(tmp_dir, "index.faiss"))
+    report = recall_report(index, vectors)
+    del vectors
+
+    return _publish(tmp_dir, merge_lexical(lexical_parts), {
+        "version": STORE_VERSION,
+        "count": count,
+        "dim": dim,
+        "vectors": name,
+        "index_kind": kind,
+        "index_type": report["type"],
+        # An explicit type (``python -m rag.ann --type``) outlives later builds
+        "requested_type": index_type,
+        "trained_count": count,
+        "ann": report,
+        "documents": documents,
+        "skipped": skipped,
+    })
+
+
+def _extend(meta, doc_ids):
+    """Append ``doc_ids`` to the live corpus; None if only a full build will do.
+
+    New rows are written past the live row count of the current vector
+    file, which readers never map, and the ANN index (if any) gets the new
+    rows added without retraining. Removals, a corpus grown past
+    ``REBUILD_GROWTH`` times what the index was trained on, or a change of
+    index type need a full build.
+    """
+    if not meta.get("vectors") or not meta["count"] or "index_kind" not in meta:
+        return None
+    added = sum(read_meta(doc_id)["count"] for doc_id in doc_ids)
+    total = meta["count"] + added
+    kind = meta["index_kind"]
+    if choose_index_type(total, meta.get("requested_type")) != kind or (kind != "flat" and total > REBUILD_GROWTH * meta["trained_count"]):
+        return None
+
+    tmp_dir = _staging_dir()
+    documents, skipped = list(meta["documents"]), list(meta.get("skipped", []))
+    path, start, dim = vectors_path(meta), meta["count"], meta["dim"]
+    with open(path, "r+b") as out:
+        # Anything past the live rows is a crashed append; overwrite it
+        out.seek(start * dim * 4)
+        lexical_parts, count, _ = _append_documents(out, doc_ids, start, dim, documents, skipped)
+        out.flush()
+        os.fsync(out.fileno())
+
+    if kind != "flat":
+        index = faiss.read_index(os.path.join(meta["path"], "index.faiss"))
+        vectors = _map_vectors(path, count, dim)
+        for lo in range(start, count, ADD_BATCH):
+            index.add(np.ascontiguousarray(vectors[lo:min(lo + ADD_BATCH, count)]))
+        del vectors
+        faiss.write_index(index, os.path.join(tmp_dir, "index.faiss"))
+
+    lexical = merge_lexical([(load_lexical(os.path.join(meta["path"], LEXICAL_FILE)), 0)] + lexical_parts)
+    meta = {key: value for key, value in meta.items() if key != "path"}
+    # ``ann`` keeps the recall measured when the index was trained
+    meta.update(count=count, documents=documents, skipped=skipped)
+    return _publish(tmp_dir, lexical, meta)
+
+
+def unused_vector_files():
+    """Vector files no remaining corpus version refers to."""
+    # Under the lock: a build's new vector file is unreferenced until it publishes
+    with _build_lock:
+        return _unused_vector_files()
+
+
+def _unused_vector_files():
+    root = _root()
+    if not os.path.isdir(root):
+        return []
+    used = set()
+    for name in os.listdir(root):
+        try:
+            with open(os.path.join(root, name, "meta.json"), encoding="utf-8") as f:
+                used.add(json.load(f).get("vectors"))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+    return [os.path.join(root, name) for name in sorted(os.listdir(root))
+            if name.startswith("vectors-") and name not in used]
+
+
+def build_corpus(doc_ids=None, index_type=None):
+    """Rebuild the corpus from scratch over ``doc_ids`` (default: every stored document)."""
+    with _build_lock:
+        return _build(sorted(doc_ids if doc_ids is not None else list_documents()), index_type)
+
+
+def ensure_corpus():
+    """Bring the corpus up to date with the stored documents; return its meta.
+
+    New documents are appended to the live corpus; anything else that
+    changed the document set triggers a full build. Documents skipped for
+    a mismatched dimension are remembered so they don't cause a rebuild
+    every time. A full build keeps the index type last asked for.
+    """
+    with _build_lock:
+        meta = read_corpus_meta()
+        doc_ids = list_documents()
+        if meta is None or not os.path.exists(os.path.join(meta["path"], LEXICAL_FILE)):
+            return _build(doc_ids, meta and meta.get("requested_type"))
+        requested = meta.get("requested_type")
+        known = {d["id"] for d in meta["documents"]} | set(meta.get("skipped", ()))
+        if known - set(doc_ids):
+            return _build(doc_ids, requested)
+        added = [doc_id for doc_id in doc_ids if doc_id not in known]
+        if not added:
+            return meta
+        return _extend(meta, added) or _build(doc_ids, requested)
+
+
+class Corpus:
+    def __init__(self, meta):
+        self.meta = meta
+        path = meta["path"]
+        self.documents = meta["documents"]
+        self.starts = np.array([d["start"] for d in self.documents], dtype="int64")
+        self.count = meta["count"]
+        self.vectors = _map_vectors(vectors_path(meta), self.count, meta["dim"])
+        self.index = None
+        if meta.get("index_type", "flat") != "flat":
+            self.index = faiss.read_index(os.path.join(path, "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        self.lexical = load_lexical(os.path.join(path, LEXICAL_FILE))
+        self._docs = OrderedDict()
+        self._docs_lock = threading.Lock()
+        hot = sorted((d["id"] for d in self.documents), key=last_access, reverse=True)[:HOT_DOCS]
+        self.pinned = {doc_id: load_index(doc_id).pin() for doc_id in hot}
+
+    def document(self, doc_id):
+        if doc_id in self.pinned:
+            return self.pinned[doc_id]
+        with self._docs_lock:
+            if doc_id in self._docs:
+                self._docs.move_to_end(doc_id)
+            else:
+                self._docs[doc_id] = load_index(doc_id)
+                while len(self._docs) > OPEN_DOCS:
+                    self._docs.popitem(last=False)
+            return self._docs[doc_id]
+
+    def touch(self, doc_ids):
+        """Record that ``doc_ids`` were just used (for LRU eviction)."""
+        for doc_id in set(doc_ids):
+            record_access(doc_id)
+
+    def _rows_for(self, doc_ids):
+        wanted = set(doc_ids)
+        return [(d["start"], d["start"] + d["count"]) for d in self.documents if d["id"] in wanted]
+
+    def search(self, queries, k, doc_ids=None):
+        """One search over the corpus, optionally restricted to ``doc_ids``.
+
+        Returns ``(distances, rows)`` like ``faiss.Index.search``; rows are
+        global corpus rows (see ``locate``); -1 marks a missing ANN result.
+        """
+        queries = np.ascontiguousarray(queries, dtype="float32")
+        if doc_ids:
+            ranges = self._rows_for(doc_ids)
+            if len(ranges) == 1:
+                # A memmap slice is still a view: no copy for a single document
+                (lo, hi), = ranges
+                base, row_map = self.vectors[lo:hi], None
+                offset = lo
+            else:
+                base = np.concatenate([self.vectors[lo:hi] for lo, hi in ranges]) if ranges else self.vectors[:0]
+                row_map = np.concatenate([np.arange(lo, hi) for lo, hi in ranges]) if ranges else None
+                offset = 0
+        elif self.index is not None:
+            return self.index.search(queries, min(k, self.count))
+        else:
+            base, row_map, offset = self.vectors, None, 0
+
+        k = min(k, len(base))
+        if k == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype("float32"), empty.astype("int64")
+        distances, rows = faiss.knn(queries, np.ascontiguousarray(base), k)
+        rows = row_map[rows] if row_map is not None else rows + offset
+        return distances, rows
+
+    def search_lexical(self, query, k, doc_ids=None):
+        """BM25 search over the corpus, optionally restricted to ``doc_ids``.
+
+        Returns ``(scores, rows)`` for one query, best first, in the same
+        global rows as ``search``.
+        """
+        return self.lexical.search(query, k, self._rows_for(doc_ids) if doc_ids else None)
+
+    def locate(self, row):
+        i = int(np.searchsorted(self.starts, row, side="right")) - 1
+        doc = self.documents[i]
+        return doc["id"], int(row) - doc["start"]
+
+    def text(self, doc_id, chunk_id):
+        return self.document(doc_id).chunks[chunk_id]
+
+    def page_of(self, doc_id, chunk_id):
+        return self.document(doc_id).page_of(chunk_id)
+
+    def scope(self, doc_ids=None):
+        """Hashable identity of what a search over ``doc_ids`` can see."""
+        wanted = set(doc_ids or ())
+        return tuple((d["id"], d["indexed_at"]) for d in self.documents if not wanted or d["id"] in wanted)
+
+    def source_of(self, doc_id):
+        for doc in self.documents:
+            if doc["id"] == doc_id:
+                return doc["source"]
+        return doc_id
+
+
+def open_corpus():
+    return Corpus(ensure_corpus())
@@ -0,0 +1,103 @@
+"""Persistent chunk embedding cache shared by every document.
+
+Vectors are keyed on a hash of the encoder model id, its inference backend
+and the chunk text, so re-indexing a revised textbook, or a syllabus PDF
+that overlaps one already indexed, only encodes chunks that have never been
+seen, and int8/ONNX vectors never stand in for fp32 ones (or vice versa). The cache is a
+SQLite file in WAL mode, safe to share between the app and ingestion
+processes. ``rag.housekeeping`` discards an evicted document's rows and
+counts the file toward the store quota.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+from rag.sqlite_cache import SqliteCache
+from rag.store import INDEX_DIR
+
+EMBED_CACHE_PATH = os.path.join(INDEX_DIR, "_embeddings.sqlite")
+# Stay well under SQLite's bound-parameter limit
+LOOKUP_BATCH = 500
+
+
+def cache_namespace(model_id, backend):
+    # fp32 keeps the plain model id, so entries cached before the backend
+    # was part of the key stay valid
+    return model_id if backend == "fp32" else f"{model_id}@{backend}"
+
+
+def chunk_key(namespace, text):
+    return hashlib.sha256(f"{namespace}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache(SqliteCache):
+    def __init__(self, model_id, backend="fp32", path=EMBED_CACHE_PATH):
+        super().__init__(path, "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+        self.model_id = model_id
+        self.backend = backend
+        self.namespace = cache_namespace(model_id, backend)
+        self.reused = 0
+        self.encoded = 0
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_BATCH):
+                batch = keys[start:start + LOOKUP_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch)
+                found.update(rows)
+        return found
+
+    def encode(self, texts, encoder, batch_size=32):
+        """Embeddings for ``texts``, encoding only the ones not cached yet."""
+        keys = [chunk_key(self.namespace, t) for t in texts]
+        found = self._lookup(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = np.asarray(encoder.encode(list(missing.values()), batch_size=batch_size), dtype="float32")
+            new = {key: vec.tobytes() for key, vec in zip(missing, vectors)}
+            with self._lock:
+                self._db.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?)", new.items())
+                self._db.commit()
+            found.update(new)
+
+        self.encoded += len(missing)
+        self.reused += len(texts) - len(missing)
+        return np.stack([np.frombuffer(found[key], dtype="float32") for key in keys]) if keys else np.zeros((0, 0), "float32")
+
+    def discard(self, texts, namespace=None):
+        """Drop the cached vectors of ``texts``; returns the bytes of row data removed.
+
+        Chunks shared with another document go too, which only costs that
+        document a re-encode should it ever be re-indexed.
+        """
+        keys = list({chunk_key(namespace or self.namespace, t) for t in texts})
+        freed = 0
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_BATCH):
+                batch = keys[start:start + LOOKUP_BATCH]
+                marks = ",".join("?" * len(batch))
+                (size,) = self._db.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(key) + LENGTH(vector)), 0) FROM embeddings WHERE key IN ({marks})",
+                    batch,
+                ).fetchone()
+                self._db.execute(f"DELETE FROM embeddings WHERE key IN ({marks})", batch)
+                freed += size
+            self._db.commit()
+        return freed
+
+    def data_bytes(self):
+        with self._lock:
+            (size,) = self._db.execute("SELECT COALESCE(SUM(LENGTH(key) + LENGTH(vector)), 0) FROM embeddings").fetchone()
+        return size
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return {"entries": entries, "reused": self.reused, "encoded": self.encoded}
@@ -0,0 +1,384 @@
+"""Page-level PDF text extraction.
+
+Large curriculum PDFs are sharded into page ranges that are extracted in a
+process pool and reassembled in page order. Every page keeps its 1-based
+page number so chunks can cite where they came from.
+
+Three extraction backends are supported. ``PDFQUERY_EXTRACTOR`` picks one:
+
+    pymupdf   PyMuPDF (fitz), much faster; the Goal5 notebook's extractor
+    pypdf     pure Python, the maintained successor of PyPDF2
+    pypdf2    PyPDF2, the original extractor
+
+``auto`` (the default) uses the fastest installed backend whose word recall
+against ``PDFQUERY_EXTRACTOR_REFERENCE`` (pypdf2) on the sample PDFs
+(``temp_*.pdf``) is at least ``PDFQUERY_EXTRACTOR_MIN_RECALL`` (95%). The
+choice is measured once and kept in ``indices/_extractor.json``; without
+samples it is the reference backend. Ligature glyphs (including Calibri's
+"ti"/"tt", which come out as Ɵ/Ʃ) are expanded to plain letters.
+
+A ``PageCache`` keeps extracted page text keyed on the document's content
+hash and the backend, so re-indexing or resuming never extracts a page
+twice::
+
+    python -m rag.extract temp_*.pdf    # speed and agreement of every backend
+"""
+import argparse
+import glob
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from rag.sqlite_cache import SqliteCache
+
+# 0 means one worker per core
+EXTRACT_WORKERS = int(os.environ.get("PDFQUERY_EXTRACT_WORKERS", "0"))
+# Below this many pages, starting the pool costs more than it saves
+PARALLEL_MIN_PAGES = int(os.environ.get("PDFQUERY_PARALLEL_MIN_PAGES", "48"))
+SHARDS_PER_WORKER = 4
+EXTRACTOR = os.environ.get("PDFQUERY_EXTRACTOR", "auto")
+EXTRACTOR_REFERENCE = os.environ.get("PDFQUERY_EXTRACTOR_REFERENCE", "pypdf2")
+EXTRACTOR_MIN_RECALL = float(os.environ.get("PDFQUERY_EXTRACTOR_MIN_RECALL", "0.95"))
+EXTRACTOR_SAMPLES = "temp_*.pdf"
+CALIBRATION_PATH = os.path.join("indices", "_extractor.json")
+PAGE_CACHE_PATH = os.path.join("indices", "_pages.sqlite")
+
+# Presentation forms, plus the private "ti"/"tt" glyphs of Calibri-based PDFs
+LIGATURES = str.maketrans({
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi", "\ufb04": "ffl", "\ufb05": "st", "\ufb06": "st",
+    "\u019f": "ti", "\u01a9": "tt",
+})
+
+_worker_pdf = None
+
+
+# ----------- BACKENDS -----------
+class PyPDF2Document:
+    def __init__(self, source):
+        from PyPDF2 import PdfReader
+
+        self._reader = PdfReader(source)
+
+    def __len__(self):
+        return len(self._reader.pages)
+
+    def page_text(self, n):
+        return (self._reader.pages[n].extract_text() or "").translate(LIGATURES)
+
+
+class PypdfDocument(PyPDF2Document):
+    def __init__(self, source):
+        from pypdf import PdfReader
+
+        self._reader = PdfReader(source)
+
+
+class PyMuPDFDocument:
+    def __init__(self, source):
+        import pymupdf
+
+        # The default flags keep ligatures as single glyphs ("ﬁ")
+        self._flags = pymupdf.TEXTFLAGS_TEXT & ~pymupdf.TEXT_PRESERVE_LIGATURES
+        if isinstance(source, str):
+            self._doc = pymupdf.open(source)
+        else:
+            self._doc = pymupdf.open(stream=source.read(), filetype="pdf")
+
+    def __len__(self):
+        return self._doc.page_count
+
+    def page_text(self, n):
+        return self._doc[n].get_text(flags=self._flags).translate(LIGATURES)
+
+
+EXTRACTORS = {"pymupdf": PyMuPDFDocument, "pypdf": PypdfDocument, "pypdf2": PyPDF2Document}
+_MODULES = {"pymupdf": "pymupdf", "pypdf": "pypdf", "pypdf2": "PyPDF2"}
+
+
+def available_extractors():
+    from importlib.util import find_spec
+
+    return [name for name in EXTRACTORS if find_spec(_MODULES[name]) is not None]
+
+
+def resolve_extractor(name=None):
+    name = name or EXTRACTOR
+    if name == "auto":
+        return auto_extractor()
+    if name not in EXTRACTORS:
+        raise ValueError(f"unknown extractor {name!r}, expected auto or one of {tuple(EXTRACTORS)}")
+    return name
+
+
+def read_pdf_bytes(source):
+    """Accept a path or a binary file-like object (e.g. a Streamlit upload)."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    source.seek(0)
+    data = source.read()
+    source.seek(0)
+    return data
+
+
+def open_document(source, extractor=None):
+    # Paths are parsed lazily from disk; uploads are already in memory
+    cls = EXTRACTORS[resolve_extractor(extractor)]
+    if isinstance(source, (str, os.PathLike)):
+        return cls(os.fspath(source))
+    return cls(io.BytesIO(read_pdf_bytes(source)))
+
+
+def _extract_range(doc, start, stop):
+    return [(n + 1, doc.page_text(n)) for n in range(start, stop)]
+
+
+def _init_worker(source, extractor):
+    # A path, or the PDF bytes sent once per worker rather than once per shard
+    global _worker_pdf
+    cls = EXTRACTORS[extractor]
+    _worker_pdf = cls(source if isinstance(source, str) else io.BytesIO(source))
+
+
+def _extract_shard(bounds):
+    return _extract_range(_worker_pdf, *bounds)
+
+
+def page_shards(start, stop, n_shards):
+    step = max(1, -(-(stop - start) // n_shards))
+    return [(lo, min(lo + step, stop)) for lo in range(start, stop, step)]
+
+
+def resolve_workers(workers=None):
+    workers = workers if workers is not None else EXTRACT_WORKERS
+    return workers or os.cpu_count() or 1
+
+
+def count_pages(source, extractor=None):
+    return len(open_document(source, extractor))
+
+
+# ----------- PAGE TEXT CACHE -----------
+def document_hash(source):
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    else:
+        digest.update(read_pdf_bytes(source))
+    return digest.hexdigest()
+
+
+class PageCache(SqliteCache):
+    """Extracted page text in SQLite, keyed on (document hash, backend, page)."""
+
+    def __init__(self, path=PAGE_CACHE_PATH):
+        super().__init__(
+            path,
+            "CREATE TABLE IF NOT EXISTS pages (doc TEXT, extractor TEXT, page INTEGER, text TEXT NOT NULL, "
+            "PRIMARY KEY (doc, extractor, page))",
+        )
+
+    def pages(self, doc_hash, extractor, first_page=1):
+        """Cached ``(page, text)`` from ``first_page`` on, stopping at the first gap."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT page, text FROM pages WHERE doc = ? AND extractor = ? AND page >= ? ORDER BY page",
+                (doc_hash, extractor, first_page),
+            ).fetchall()
+        contiguous = []
+        for expected, (page, text) in enumerate(rows, first_page):
+            if page != expected:
+                break
+            contiguous.append((page, text))
+        return contiguous
+
+    def put(self, doc_hash, extractor, pages):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                [(doc_hash, extractor, page, text) for page, text in pages],
+            )
+            self._db.commit()
+
+    def discard(self, doc_prefix):
+        """Drop every page of the documents whose hash starts with ``doc_prefix`` (a doc id).
+
+        Returns the bytes of page text removed.
+        """
+        # Hashes are lowercase hex, so the prefix's range ends before prefix + "g"
+        where, args = "doc >= ? AND doc < ?", (doc_prefix, doc_prefix + "g")
+        with self._lock:
+            (size,) = self._db.execute(f"SELECT COALESCE(SUM(LENGTH(text)), 0) FROM pages WHERE {where}", args).fetchone()
+            self._db.execute(f"DELETE FROM pages WHERE {where}", args)
+            self._db.commit()
+        return size
+
+    def data_bytes(self):
+        with self._lock:
+            (size,) = self._db.execute("SELECT COALESCE(SUM(LENGTH(text)), 0) FROM pages").fetchone()
+        return size
+
+
+# ----------- EXTRACTION -----------
+def _extract(source, doc, extractor, start, workers):
+    n_pages = len(doc)
+    workers = min(resolve_workers(workers), max(n_pages - start, 1))
+    if workers <= 1 or n_pages - start < PARALLEL_MIN_PAGES:
+        for n in range(start, n_pages):
+            yield n + 1, doc.page_text(n)
+        return
+
+    payload = os.fspath(source) if isinstance(source, (str, os.PathLike)) else read_pdf_bytes(source)
+    shards = page_shards(start, n_pages, workers * SHARDS_PER_WORKER)
+    # spawn, not fork: the Streamlit process has torch threads running
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(payload, extractor)) as pool:
+        # map() yields shard results in submission order, i.e. page order
+        for shard in pool.map(_extract_shard, shards):
+            yield from shard
+
+
+def iter_pages(source, workers=None, first_page=1, extractor=None, cache=None):
+    """Yield ``(page_number, text)`` in page order, starting at ``first_page``.
+
+    With a ``PageCache``, cached pages are yielded without parsing and newly
+    extracted ones are stored as they go.
+    """
+    extractor = resolve_extractor(extractor)
+    doc = open_document(source, extractor)
+    n_pages = len(doc)
+    start = max(first_page, 1) - 1
+
+    doc_hash = None
+    if cache is not None:
+        doc_hash = document_hash(source)
+        for page, text in cache.pages(doc_hash, extractor, start + 1):
+            if page > n_pages:
+                return
+            yield page, text
+            start = page
+
+    pending = []
+    for page, text in _extract(source, doc, extractor, start, workers):
+        yield page, text
+        if cache is not None:
+            pending.append((page, text))
+            if len(pending) >= SHARDS_PER_WORKER * 16:
+                cache.put(doc_hash, extractor, pending)
+                pending = []
+    if pending:
+        cache.put(doc_hash, extractor, pending)
+
+
+def extract_pages(source, workers=None, extractor=None):
+    """Return ``[(page_number, text), ...]`` in page order."""
+    return list(iter_pages(source, workers, extractor=extractor))
+
+
+# ----------- BACKEND BENCHMARK -----------
+def _words(pages):
+    # The terms the lexical index sees, so spacing around punctuation doesn't count
+    from rag.lexical import tokenize
+
+    return set(tokenize(" ".join(text for _, text in pages).translate(LIGATURES)))
+
+
+def benchmark_extractors(paths, reference="pypdf2", repeat=3):
+    """Pages/s of every installed backend, and word agreement with ``reference``."""
+    results, references = {}, {}
+    for name in available_extractors():
+        pages_per_s, agreement, chars = [], [], 0
+        for path in paths:
+            times = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                pages = extract_pages(path, workers=1, extractor=name)
+                times.append(time.perf_counter() - started)
+            pages_per_s.append(len(pages) / min(times) if min(times) else 0.0)
+            chars += sum(len(text) for _, text in pages)
+            if reference in EXTRACTORS and reference != name:
+                if path not in references:
+                    references[path] = _words(extract_pages(path, workers=1, extractor=reference))
+                ref = references[path]
+                agreement.append(len(_words(pages) & ref) / len(ref) if ref else 1.0)
+        results[name] = {
+            "pages_per_s": sum(pages_per_s) / len(pages_per_s) if pages_per_s else 0.0,
+            "chars": chars,
+            "word_recall_vs_reference": sum(agreement) / len(agreement) if agreement else 1.0,
+        }
+    return results
+
+
+def _fallback_extractor(reference=EXTRACTOR_REFERENCE):
+    available = available_extractors()
+    if not available:
+        raise ImportError("no PDF extractor installed: pip install pymupdf, pypdf or PyPDF2")
+    # Otherwise the original extractor, last in EXTRACTORS
+    return reference if reference in available else available[-1]
+
+
+def calibrate_extractor(paths, reference=EXTRACTOR_REFERENCE, min_recall=EXTRACTOR_MIN_RECALL, repeat=1, save=True):
+    """Benchmark the backends on ``paths`` and pick the fastest one with at
+    least ``min_recall`` word recall against ``reference``."""
+    results = benchmark_extractors(paths, reference, repeat)
+    good = [name for name, r in results.items() if r["word_recall_vs_reference"] >= min_recall]
+    calibration = {
+        "extractor": max(good, key=lambda name: results[name]["pages_per_s"]) if good else _fallback_extractor(reference),
+        "reference": reference,
+        "min_recall": min_recall,
+        "available": available_extractors(),
+        "samples": [os.path.basename(path) for path in paths],
+        "results": results,
+    }
+    if save:
+        os.makedirs(os.path.dirname(CALIBRATION_PATH), exist_ok=True)
+        tmp = f"{CALIBRATION_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(calibration, f, indent=2)
+        os.replace(tmp, CALIBRATION_PATH)
+    return calibration
+
+
+@lru_cache(maxsize=None)
+def auto_extractor():
+    """The backend ``auto`` stands for, calibrated once on the sample PDFs."""
+    available = available_extractors()
+    try:
+        with open(CALIBRATION_PATH) as f:
+            calibration = json.load(f)
+        # Still valid unless the settings or the installed backends changed
+        if (calibration["reference"], calibration["min_recall"], calibration["available"]) == (
+                EXTRACTOR_REFERENCE, EXTRACTOR_MIN_RECALL, available):
+            return calibration["extractor"]
+    except (OSError, ValueError, KeyError):
+        pass
+    paths = sorted(glob.glob(EXTRACTOR_SAMPLES))
+    if not paths:
+        return _fallback_extractor()
+    return calibrate_extractor(paths)["extractor"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the installed PDF extraction backends.")
+    parser.add_argument("pdfs", nargs="*", help="PDFs to extract (default: temp_*.pdf)")
+    parser.add_argument("--reference", choices=tuple(EXTRACTORS), default=EXTRACTOR_REFERENCE,
+                        help="backend whose words count as correct")
+    parser.add_argument("--min-recall", type=float, default=EXTRACTOR_MIN_RECALL)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = args.pdfs or sorted(glob.glob(EXTRACTOR_SAMPLES))
+    if not paths:
+        parser.error(f"no PDFs given and no {EXTRACTOR_SAMPLES} here")
+    calibration = calibrate_extractor(paths, args.reference, args.min_recall, args.repeat, save=False)
+    print(json.dumps(calibration["results"], indent=2))
+    print(f"Fastest backend with >= {args.min_recall:.0%} word recall: {calibration['extractor']} "
+          f"(PDFQUERY_EXTRACTOR={calibration['extractor']})")
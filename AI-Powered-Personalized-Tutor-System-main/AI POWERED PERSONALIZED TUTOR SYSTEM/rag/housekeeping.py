@@ -0,0 +1,256 @@
+"""Disk quota, LRU eviction and garbage collection for the index store.
+
+Two kinds of cleanup keep ``indices/`` from growing without bound on
+shared hosts:
+
+* eviction: when ``indices/`` exceeds ``PDFQUERY_STORE_QUOTA_MB``, the
+  least recently used documents (see ``rag.store.record_access``) are
+  deleted until it fits again. The quota covers everything in the store:
+  the per-document stores, the corpus (which mirrors their vectors and
+  shrinks with them) and the embedding and page caches, whose rows for an
+  evicted document are deleted with it;
+* garbage collection: untracked ``temp_*.pdf`` files left by the old
+  upload path (the ones checked into git are sample inputs for
+  ``rag.bench`` and ``rag.extract``), documents ingested from a file that no longer exists, ``.partial``/``.tmp``
+  directories abandoned by crashed builds, and superseded or removed store
+  versions that could not be deleted at the time because another process
+  still had them memory-mapped.
+
+Legacy ``*.pkl`` indexes are never deleted: a removed document's pickles
+are recorded with ``rag.store.retire_pickles`` instead, so they are not
+migrated back. The corpus is rebuilt afterwards if any document was
+removed::
+
+    python -m rag.housekeeping [--quota-mb 2048] [--dry-run]
+"""
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import time
+
+from rag.embed_cache import EMBED_CACHE_PATH, EmbeddingCache
+from rag.extract import PAGE_CACHE_PATH, PageCache
+from rag.models import ENCODER_MODEL
+from rag.store import (
+    INDEX_DIR, delete_document, directory_size, document_size, index_exists, last_access, list_documents,
+    live_dir, load_index, read_meta, remove_path, retire_pickles, superseded_versions,
+)
+
+# 0 means no quota
+STORE_QUOTA_MB = float(os.environ.get("PDFQUERY_STORE_QUOTA_MB", "0"))
+AUTO_GC = os.environ.get("PDFQUERY_AUTO_GC", "0") == "1"
+TEMP_PDF_PATTERN = "temp_*.pdf"
+# The old upload path wrote a temp PDF and read it straight back
+TEMP_GRACE_SECONDS = 3600
+STALE_BUILD_SECONDS = 7 * 24 * 3600
+
+
+CACHE_PATHS = (EMBED_CACHE_PATH, PAGE_CACHE_PATH)
+
+
+def cache_bytes():
+    """Bytes of the SQLite caches, including their WAL and shared-memory files."""
+    return sum(os.path.getsize(path + suffix) for path in CACHE_PATHS for suffix in ("", "-wal", "-shm")
+               if os.path.exists(path + suffix))
+
+
+def store_usage():
+    """Size and last access of every document, plus the store totals.
+
+    A document's ``corpus_bytes`` are its rows in the corpus vector file,
+    which a corpus rebuild frees once the document is gone.
+    """
+    from rag.corpus import CORPUS_ID
+
+    documents = {}
+    for doc_id in list_documents():
+        meta = read_meta(doc_id)
+        documents[doc_id] = {
+            "bytes": document_size(doc_id),
+            "corpus_bytes": meta["count"] * meta["dim"] * 4,
+            "last_access": last_access(doc_id),
+        }
+    usage = {
+        "documents": documents,
+        "document_bytes": sum(d["bytes"] for d in documents.values()),
+        "corpus_bytes": directory_size(os.path.join(INDEX_DIR, CORPUS_ID)),
+        "cache_bytes": cache_bytes(),
+        "quota_bytes": int(STORE_QUOTA_MB * 2 ** 20),
+    }
+    usage["total_bytes"] = usage["document_bytes"] + usage["corpus_bytes"] + usage["cache_bytes"]
+    return usage
+
+
+def open_caches():
+    """The caches that exist on disk, for pruning (never creates one)."""
+    caches = []
+    if os.path.exists(EMBED_CACHE_PATH):
+        caches.append(EmbeddingCache(ENCODER_MODEL))
+    if os.path.exists(PAGE_CACHE_PATH):
+        caches.append(PageCache())
+    return caches
+
+
+def prune_caches(doc_id, caches):
+    """Delete the document's rows from ``caches``; returns the bytes of row data removed."""
+    freed = 0
+    for cache in caches:
+        if isinstance(cache, EmbeddingCache):
+            # Documents indexed before the namespace was recorded used fp32
+            namespace = read_meta(doc_id).get("embedding_namespace", ENCODER_MODEL)
+            freed += cache.discard(load_index(doc_id).chunks, namespace)
+        else:
+            freed += cache.discard(doc_id)
+    return freed
+
+
+def remove_document(doc_id, caches=None):
+    """Delete a document and its cache rows; returns the cache bytes freed."""
+    freed = 0
+    if index_exists(doc_id):
+        freed = prune_caches(doc_id, open_caches() if caches is None else caches)
+    delete_document(doc_id)
+    # Otherwise the next start would migrate the legacy pickle right back
+    retire_pickles(doc_id)
+    return freed
+
+
+def evict_lru(quota_bytes, protect=(), dry_run=False):
+    """Delete least recently used documents until the store fits ``quota_bytes``.
+
+    Each eviction is counted as freeing the document's store, its corpus
+    rows and its share of the cache files (by row data removed); the caches
+    are vacuumed afterwards so the files actually shrink.
+    """
+    usage = store_usage()
+    total, evicted = usage["total_bytes"], []
+    caches = [] if dry_run else open_caches()
+    data = sum(cache.data_bytes() for cache in caches)
+    # File bytes per byte of row data: pages, indexes and free space included
+    cache_scale = usage["cache_bytes"] / data if data else 0.0
+    by_age = sorted(usage["documents"].items(), key=lambda item: item[1]["last_access"])
+    for doc_id, info in by_age:
+        if total <= quota_bytes:
+            break
+        if doc_id in protect:
+            continue
+        freed = info["bytes"] + info["corpus_bytes"]
+        if not dry_run:
+            freed += remove_document(doc_id, caches) * cache_scale
+        total -= freed
+        evicted.append(doc_id)
+    if evicted:
+        for cache in caches:
+            cache.vacuum()
+    return evicted
+
+
+def tracked_files(paths):
+    """Those of ``paths`` that are checked into git (empty outside a work tree)."""
+    if not paths:
+        return set()
+    try:
+        listed = subprocess.run(["git", "ls-files", "-z", "--", *paths], capture_output=True, check=True,
+                                timeout=30).stdout
+    except (OSError, subprocess.SubprocessError):
+        return set()
+    return {os.path.normpath(path) for path in listed.decode("utf-8").split("\0") if path}
+
+
+def orphaned_temp_pdfs(now=None):
+    now = now or time.time()
+    paths = sorted(glob.glob(TEMP_PDF_PATTERN))
+    keep = tracked_files(paths)
+    return [path for path in paths
+            if os.path.normpath(path) not in keep and now - os.path.getmtime(path) > TEMP_GRACE_SECONDS]
+
+
+def missing_sources():
+    """Documents ingested from a path that no longer exists."""
+    gone = []
+    for doc_id in list_documents():
+        source_path = read_meta(doc_id).get("source_path")
+        if source_path and not os.path.exists(source_path):
+            gone.append(doc_id)
+    return gone
+
+
+def stale_builds(now=None):
+    now = now or time.time()
+    if not os.path.isdir(INDEX_DIR):
+        return []
+    return [
+        os.path.join(INDEX_DIR, name) for name in sorted(os.listdir(INDEX_DIR))
+        if name.startswith(".") and name.endswith((".partial", ".tmp"))
+        and now - os.path.getmtime(os.path.join(INDEX_DIR, name)) > STALE_BUILD_SECONDS
+    ]
+
+
+def dead_versions(now=None):
+    """Superseded versions of live stores, and stores left without a live version."""
+    from rag.corpus import unused_vector_files
+
+    now = now or time.time()
+    if not os.path.isdir(INDEX_DIR):
+        return []
+    dead = []
+    for name in sorted(os.listdir(INDEX_DIR)):
+        root = os.path.join(INDEX_DIR, name)
+        if name.startswith(".") or not os.path.isdir(root):
+            continue
+        if live_dir(root) is None:
+            # A version being published is renamed in just before CURRENT is written
+            if now - os.path.getmtime(root) > TEMP_GRACE_SECONDS:
+                dead.append(root)
+        else:
+            dead.extend(superseded_versions(root))
+    return dead + unused_vector_files()
+
+
+def collect_garbage(protect=(), dry_run=False):
+    """Remove leftovers; returns what was (or would be) removed by kind."""
+    removed = {
+        "temp_pdfs": orphaned_temp_pdfs(),
+        "missing_sources": [d for d in missing_sources() if d not in protect],
+        "stale_builds": stale_builds(),
+        "dead_versions": dead_versions(),
+    }
+    if not dry_run:
+        for path in removed["temp_pdfs"]:
+            os.remove(path)
+        for doc_id in removed["missing_sources"]:
+            remove_document(doc_id)
+        for path in removed["stale_builds"]:
+            shutil.rmtree(path, ignore_errors=True)
+        for path in removed["dead_versions"]:
+            remove_path(path)
+    return removed
+
+
+def housekeep(quota_mb=STORE_QUOTA_MB, gc=True, protect=(), dry_run=False):
+    """Garbage-collect (if ``gc``), then enforce the quota (if any)."""
+    from rag.corpus import ensure_corpus
+
+    report = collect_garbage(protect, dry_run) if gc else {}
+    report["evicted"] = evict_lru(int(quota_mb * 2 ** 20), protect, dry_run) if quota_mb else []
+    if not dry_run and (report["evicted"] or report.get("missing_sources")):
+        ensure_corpus()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enforce the index store quota and remove leftovers.")
+    parser.add_argument("--quota-mb", type=float, default=STORE_QUOTA_MB, help="0 disables eviction")
+    parser.add_argument("--dry-run", action="store_true", help="only list what would be removed")
+    args = parser.parse_args()
+
+    report = housekeep(args.quota_mb, dry_run=args.dry_run)
+    verb = "Would remove" if args.dry_run else "Removed"
+    for kind, items in report.items():
+        print(f"{verb} {len(items)} {kind.replace('_', ' ')}: {', '.join(items) or '-'}")
+    usage = store_usage()
+    print(f"{len(usage['documents'])} document(s), {usage['total_bytes'] / 2 ** 20:.1f} MiB in total "
+          f"(documents {usage['document_bytes'] / 2 ** 20:.1f}, corpus {usage['corpus_bytes'] / 2 ** 20:.1f}, "
+          f"caches {usage['cache_bytes'] / 2 ** 20:.1f})")
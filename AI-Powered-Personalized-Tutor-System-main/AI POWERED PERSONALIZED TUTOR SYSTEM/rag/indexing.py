@@ -0,0 +1,96 @@
+"""Streaming indexing pipeline: pages -> chunks -> embedding batches -> store.
+
+Only one embedding batch is held in memory at a time. Each batch is appended
+to the document's partial store and checkpointed, so a crash partway through
+a large PDF resumes from the last finished batch instead of starting over.
+"""
+import os
+
+from rag.chunking import ChunkStats, default_chunker
+from rag.extract import count_pages, iter_pages
+from rag.lexical import build_lexical
+from rag.store import StoreWriter
+
+EMBED_BATCH = int(os.environ.get("PDFQUERY_EMBED_BATCH", "64"))
+
+
+def iter_chunks(pages, chunker=None):
+    """Split each page separately so every chunk maps to exactly one page."""
+    chunker = chunker or default_chunker()
+    for page_number, text in pages:
+        for chunk in chunker.split(text):
+            yield page_number, chunk
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def resume_point(writer):
+    """First page still to process, and how many of its chunks are already stored.
+
+    Chunks of one page are contiguous, so every page before the last stored
+    one is complete.
+    """
+    pages = writer.pages()
+    if len(pages) == 0:
+        return 1, 0
+    last = int(pages[-1])
+    return last, int((pages == last).sum())
+
+
+def index_document(doc_id, source, encoder, name, workers=None, batch_size=EMBED_BATCH, progress=None,
+                   embedding_cache=None, page_cache=None):
+    """Index a PDF into the store under ``doc_id``, resuming a crashed run.
+
+    ``progress(pages_done, total_pages, chunks_done)`` is called after every
+    embedding batch. Token waste and truncation per model window (see
+    ``rag.chunking``) are recorded as ``chunking``. With an
+    ``embedding_cache`` (see ``rag.embed_cache``) only chunks never seen
+    before are encoded, and with a ``page_cache`` (see ``rag.extract``) only
+    pages never seen before are parsed. When ``source`` is a path it is
+    recorded as ``source_path``, so the index can be collected once the file
+    is gone. The document gets no ANN index of its own: it is searched
+    through the corpus (see ``rag.corpus``).
+    """
+    writer = StoreWriter(doc_id, dim=encoder.get_sentence_embedding_dimension(), resume=True)
+    first_page, skip = resume_point(writer)
+    total_pages = count_pages(source)
+
+    chunks = iter_chunks(iter_pages(source, workers, first_page, cache=page_cache))
+    for _ in range(skip):
+        next(chunks, None)
+
+    reused = 0
+    stats = ChunkStats(writer.state["extra"].get("chunking"))
+    for batch in batched(chunks, batch_size):
+        pages = [page for page, _ in batch]
+        texts = [text for _, text in batch]
+        if embedding_cache is not None:
+            before = embedding_cache.reused
+            embeddings = embedding_cache.encode(texts, encoder, batch_size)
+            reused += embedding_cache.reused - before
+        else:
+            embeddings = encoder.encode(texts, batch_size=batch_size)
+        writer.append(embeddings, texts, pages)
+        stats.add(texts)
+        writer.checkpoint(chunking=stats.counts)
+        if progress:
+            progress(pages[-1], total_pages, writer.count)
+
+    lexical = build_lexical(writer.chunks())
+    extra = {"source_path": os.path.abspath(source)} if isinstance(source, (str, os.PathLike)) else {}
+    if embedding_cache is not None:
+        # So eviction can find this document's rows in the cache
+        extra["embedding_namespace"] = embedding_cache.namespace
+    return writer.commit(
+        lexical, source=name, pages_total=total_pages, reused_embeddings=reused,
+        lexical_terms=len(lexical.terms), chunking=stats.report(), **extra,
+    )
@@ -0,0 +1,186 @@
+"""Content-addressed PDF ingestion.
+
+Documents are keyed on a streaming SHA-256 of their bytes, never on the file
+name, so the same PDF uploaded under another name (by any user, in any
+session) reuses the existing index, and two different PDFs that happen to
+share a name no longer collide.
+
+A whole library can be indexed offline, with one encoder per process, into
+the same ``indices/`` store the app reads::
+
+    python -m rag.ingest /srv/library [--workers 4] [--batch-size 64]
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from rag.store import INDEX_DIR, index_exists
+
+HASH_BLOCK = 1 << 20
+DOC_ID_LENGTH = 16
+
+_build_locks = defaultdict(threading.Lock)
+_build_locks_guard = threading.Lock()
+
+
+def content_hash(stream):
+    """Hash a binary file-like object in fixed blocks and rewind it."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(HASH_BLOCK), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()[:DOC_ID_LENGTH]
+
+
+def ensure_indexed(doc_id, build):
+    """Run ``build()`` unless ``doc_id`` is already in the store.
+
+    Returns True when this call did the indexing. Sessions racing on the same
+    document wait for the first one instead of indexing it again.
+    """
+    if index_exists(doc_id):
+        return False
+    with _build_locks_guard:
+        lock = _build_locks[doc_id]
+    with lock:
+        if index_exists(doc_id):
+            return False
+        build()
+        return True
+
+
+# ----------- BULK INGESTION CLI -----------
+_worker = {}
+
+
+def find_pdfs(root):
+    """Every ``*.pdf`` under ``root``, in a stable order."""
+    for folder, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                yield os.path.join(folder, name)
+
+
+def plan(root):
+    """``[(doc_id, path), ...]`` still to index; duplicates and stored docs are skipped."""
+    todo, seen, skipped = [], set(), 0
+    for path in find_pdfs(root):
+        with open(path, "rb") as f:
+            doc_id = content_hash(f)
+        if doc_id in seen or index_exists(doc_id):
+            skipped += 1
+            continue
+        seen.add(doc_id)
+        todo.append((doc_id, path))
+    return todo, skipped
+
+
+def cpu_batch_size(threads):
+    """Embedding batch for ``threads`` intra-op threads: big enough to keep
+    them busy, small enough to stay in cache-friendly territory."""
+    return max(16, min(256, 32 * threads))
+
+
+def _init_worker(backend, threads):
+    import torch
+
+    from rag.embed_cache import EmbeddingCache
+    from rag.extract import PageCache
+    from rag.models import ENCODER_MODEL, load_encoder
+
+    torch.set_num_threads(threads)
+    _worker["encoder"] = load_encoder(backend)
+    _worker["cache"] = EmbeddingCache(ENCODER_MODEL, backend)
+    _worker["pages"] = PageCache()
+
+
+def _index_one(doc_id, path, name, batch_size, extract_workers):
+    from rag.indexing import index_document
+
+    started = time.perf_counter()
+    meta = index_document(
+        doc_id, path, _worker["encoder"], name, workers=extract_workers,
+        batch_size=batch_size, embedding_cache=_worker["cache"], page_cache=_worker["pages"],
+    )
+    return meta["count"], time.perf_counter() - started
+
+
+def ingest_directory(root, workers=None, batch_size=None, backend=None):
+    """Index every new PDF under ``root``; returns ``(indexed, skipped, failed)``."""
+    from rag.corpus import ensure_corpus
+    from rag.models import BACKEND
+
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    todo, skipped = plan(root)
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or max(1, cpus // 2), len(todo) or 1))
+    threads = max(1, cpus // workers)
+    batch_size = batch_size or cpu_batch_size(threads)
+    backend = backend or BACKEND
+    print(f"{len(todo)} PDF(s) to index, {skipped} already indexed or duplicate; "
+          f"{workers} process(es) x {threads} thread(s), batch {batch_size}")
+
+    indexed, failed = [], []
+
+    def report(path, result=None, error=None):
+        done = len(indexed) + len(failed)
+        if error is None:
+            print(f"[{done}/{len(todo)}] {path}: {result[0]} chunks in {result[1]:.1f} s")
+        else:
+            print(f"[{done}/{len(todo)}] {path}: FAILED ({error})", file=sys.stderr)
+
+    if workers == 1:
+        # One document at a time: let extraction use its own process pool
+        _init_worker(backend, threads)
+        for doc_id, path in todo:
+            try:
+                result = _index_one(doc_id, path, os.path.relpath(path, root), batch_size, None)
+                indexed.append(doc_id)
+                report(path, result)
+            except Exception as e:
+                failed.append(path)
+                report(path, error=e)
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(backend, threads)) as pool:
+            futures = {
+                pool.submit(_index_one, doc_id, path, os.path.relpath(path, root), batch_size, 1): (doc_id, path)
+                for doc_id, path in todo
+            }
+            for future in as_completed(futures):
+                doc_id, path = futures[future]
+                try:
+                    result = future.result()
+                    indexed.append(doc_id)
+                    report(path, result)
+                except Exception as e:
+                    failed.append(path)
+                    report(path, error=e)
+
+    if indexed:
+        meta = ensure_corpus()
+        print(f"Corpus updated: {meta['count']} chunks from {len(meta['documents'])} document(s)")
+    return indexed, skipped, failed
+
+
+if __name__ == "__main__":
+    from rag.models import BACKENDS
+
+    parser = argparse.ArgumentParser(description="Index every PDF under a directory into the PdfQuery store.")
+    parser.add_argument("root", help="directory to walk for *.pdf files")
+    parser.add_argument("--workers", type=int, default=None, help="indexing processes (default: half the cores)")
+    parser.add_argument("--batch-size", type=int, default=None, help="embedding batch (default: sized to the threads per process)")
+    parser.add_argument("--backend", choices=BACKENDS, default=None)
+    args = parser.parse_args()
+
+    _, _, failed = ingest_directory(args.root, args.workers, args.batch_size, args.backend)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,116 @@
+"""Background indexing jobs, so uploads never block the Streamlit script.
+
+A ``JobQueue`` owns a small thread pool and a job table keyed on doc id.
+Submitting a document that already has a queued, running or finished job
+returns that job instead of starting the work again, so reruns triggered
+by other widgets (or another session uploading the same PDF) merge into
+one job. A failed job stays failed until it is submitted with ``retry``;
+a finished job whose index has since been evicted is replaced by a new one.
+
+Workers only update the job record; the page polls ``jobs()`` and renders
+progress itself, since Streamlit calls are not allowed from other threads.
+``on_done`` (e.g. adding the document to the corpus) also runs on the
+worker, before the job is marked done, so a done job is searchable.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rag.ingest import ensure_indexed
+from rag.store import index_exists
+
+# Indexing is CPU bound and torch already uses every core: one at a time
+JOB_WORKERS = int(os.environ.get("PDFQUERY_JOB_WORKERS", "1"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class Job:
+    def __init__(self, doc_id, name):
+        self.doc_id = doc_id
+        self.name = name
+        self.state = QUEUED
+        self.error = None
+        self.built = False
+        self.pages_done = 0
+        self.total_pages = 0
+        self.chunks_done = 0
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+    @property
+    def fraction(self):
+        if self.state == DONE:
+            return 1.0
+        return self.pages_done / self.total_pages if self.total_pages else 0.0
+
+    def report(self, pages_done, total_pages, chunks_done):
+        """Progress callback for ``index_document``."""
+        self.pages_done, self.total_pages, self.chunks_done = pages_done, total_pages, chunks_done
+
+    def as_dict(self):
+        return {
+            "doc_id": self.doc_id,
+            "name": self.name,
+            "state": self.state,
+            "progress": self.fraction,
+            "chunks": self.chunks_done,
+            "error": self.error,
+            "seconds": (self.finished_at or time.time()) - self.started_at if self.started_at else None,
+        }
+
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS, on_done=None):
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="pdfquery-index")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._on_done = on_done
+
+    def submit(self, doc_id, name, build, retry=False):
+        """Queue ``build(job)`` for ``doc_id`` unless it already has a job.
+
+        ``build`` receives the job so it can pass ``job.report`` as the
+        indexing progress callback. Returns the (possibly existing) job.
+        """
+        with self._lock:
+            job = self._jobs.get(doc_id)
+            evicted = job is not None and job.state == DONE and not index_exists(doc_id)
+            if job is not None and not evicted and not (retry and job.state == FAILED):
+                return job
+            job = self._jobs[doc_id] = Job(doc_id, name)
+        self._pool.submit(self._run, job, build)
+        return job
+
+    def _run(self, job, build):
+        job.state, job.started_at = RUNNING, time.time()
+        try:
+            job.built = ensure_indexed(job.doc_id, lambda: build(job))
+            if self._on_done:
+                self._on_done(job)
+            job.state = DONE
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.state = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, doc_id):
+        return self._jobs.get(doc_id)
+
+    def jobs(self):
+        """Every job, oldest first."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.submitted_at)
+
+    def pending(self):
+        return [job for job in self.jobs() if not job.finished]
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
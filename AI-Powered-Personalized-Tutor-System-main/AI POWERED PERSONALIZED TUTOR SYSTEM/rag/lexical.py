@@ -0,0 +1,167 @@
+"""BM25 inverted index over chunk text, and reciprocal-rank fusion.
+
+Dense MiniLM search is weak on exact terms (formulas, chapter names,
+rare words), so each document also gets a BM25 index stored next to its
+vectors as ``lexical.npz``. The corpus merges them into one index with
+global row ids, so one lexical search and one dense search cover the whole
+library and are fused with ``rrf`` before the cross-encoder.
+
+The index is flat arrays rather than a dict of lists:
+
+    terms     sorted vocabulary (looked up with ``np.searchsorted``)
+    ptr       postings of term ``t`` are ``rows/tfs[ptr[t]:ptr[t + 1]]``
+    rows      chunk row of every posting, ascending within a term
+    tfs       term frequency of every posting
+    lengths   token count of every chunk (BM25 length normalisation)
+
+In memory ``terms`` is an object array of ``str``; a fixed-width unicode
+array would pad every term to the longest one (4 bytes per character), so
+one long token in a PDF would blow up the whole vocabulary. On disk the
+terms are one UTF-8 blob plus int64 byte offsets.
+"""
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+LEXICAL_FILE = "lexical.npz"
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+class LexicalIndex:
+    def __init__(self, terms, ptr, rows, tfs, lengths):
+        self.terms = terms
+        self.ptr = ptr
+        self.rows = rows
+        self.tfs = tfs
+        self.lengths = lengths
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    @property
+    def count(self):
+        return len(self.lengths)
+
+    def save(self, path):
+        encoded = [term.encode("utf-8") for term in self.terms]
+        term_offsets = np.zeros(len(encoded) + 1, dtype="int64")
+        np.cumsum([len(b) for b in encoded], out=term_offsets[1:])
+        term_blob = np.frombuffer(b"".join(encoded), dtype="uint8")
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, term_blob=term_blob, term_offsets=term_offsets, ptr=self.ptr, rows=self.rows, tfs=self.tfs,
+                 lengths=self.lengths)
+        os.replace(tmp, path)
+
+    def _postings(self, term):
+        i = int(np.searchsorted(self.terms, term))
+        if i == len(self.terms) or self.terms[i] != term:
+            return None
+        return self.rows[self.ptr[i]:self.ptr[i + 1]], self.tfs[self.ptr[i]:self.ptr[i + 1]]
+
+    def search(self, query, k, ranges=None):
+        """Top ``k`` chunks by BM25 as ``(scores, rows)``, best first.
+
+        ``ranges`` is an optional list of ``(lo, hi)`` row ranges to keep.
+        """
+        found_rows, found_scores = [], []
+        for term, qtf in Counter(tokenize(query)).items():
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            rows, tfs = postings
+            idf = np.log1p((self.count - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[rows] / self.avg_length)
+            found_rows.append(rows)
+            found_scores.append(qtf * idf * tfs * (BM25_K1 + 1) / (tfs + norm))
+        if not found_rows:
+            return np.zeros(0, dtype="float32"), np.zeros(0, dtype="int64")
+
+        rows = np.concatenate(found_rows)
+        scores = np.concatenate(found_scores)
+        if ranges is not None:
+            keep = np.zeros(len(rows), dtype=bool)
+            for lo, hi in ranges:
+                keep |= (rows >= lo) & (rows < hi)
+            rows, scores = rows[keep], scores[keep]
+        unique, inverse = np.unique(rows, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores)
+        top = np.argsort(-totals, kind="stable")[:k]
+        return totals[top].astype("float32"), unique[top].astype("int64")
+
+
+def build_lexical(texts):
+    """Build a ``LexicalIndex`` from an iterable of chunk texts."""
+    term_rows, term_tfs, lengths = {}, {}, []
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            term_rows.setdefault(term, []).append(row)
+            term_tfs.setdefault(term, []).append(tf)
+
+    terms = sorted(term_rows)
+    sizes = [len(term_rows[t]) for t in terms]
+    ptr = np.zeros(len(terms) + 1, dtype="int64")
+    np.cumsum(sizes, out=ptr[1:])
+    rows = np.fromiter((r for t in terms for r in term_rows[t]), dtype="int32", count=int(ptr[-1]))
+    tfs = np.fromiter((f for t in terms for f in term_tfs[t]), dtype="float32", count=int(ptr[-1]))
+    return LexicalIndex(_term_array(terms), ptr, rows, tfs, np.asarray(lengths, dtype="float32"))
+
+
+def _term_array(terms):
+    array = np.empty(len(terms), dtype=object)
+    array[:] = terms
+    return array
+
+
+def load_lexical(path):
+    with np.load(path) as data:
+        if "term_blob" in data:
+            blob, offsets = data["term_blob"].tobytes(), data["term_offsets"]
+            terms = _term_array([blob[a:b].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])])
+        else:
+            # Written before terms were stored as a blob: fixed-width unicode
+            terms = _term_array(data["terms"].tolist())
+        return LexicalIndex(terms, data["ptr"], data["rows"], data["tfs"], data["lengths"])
+
+
+def merge_lexical(parts):
+    """Merge ``[(index, row_offset), ...]`` into one index over global rows."""
+    parts = [(index, offset) for index, offset in parts if index.count]
+    if not parts:
+        return build_lexical([])
+    terms = np.unique(np.concatenate([index.terms for index, _ in parts]))
+    term_ids, rows, tfs, lengths = [], [], [], []
+    for index, offset in parts:
+        global_ids = np.searchsorted(terms, index.terms)
+        term_ids.append(np.repeat(global_ids, np.diff(index.ptr)))
+        rows.append(index.rows.astype("int64") + offset)
+        tfs.append(index.tfs)
+        lengths.append(index.lengths)
+
+    term_ids, rows, tfs = np.concatenate(term_ids), np.concatenate(rows), np.concatenate(tfs)
+    order = np.lexsort((rows, term_ids))
+    ptr = np.zeros(len(terms) + 1, dtype="int64")
+    np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=ptr[1:])
+    # Parts are contiguous, ascending row ranges, so lengths concatenate in row order
+    return LexicalIndex(terms, ptr, rows[order].astype("int32"), tfs[order], np.concatenate(lengths))
+
+
+def rrf(rankings, k=RRF_K):
+    """Reciprocal-rank fusion of several best-first id lists.
+
+    Returns ``[(id, score), ...]`` best first; ties keep first-seen order.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
@@ -0,0 +1,264 @@
+"""Model identifiers and lazy, optionally quantised loading for PdfQuery.
+
+Nothing is loaded when the page is imported: each model is wrapped in a
+``LazyModel`` that loads on first use (or in a background warm-up thread).
+``PDFQUERY_BACKEND`` picks the CPU inference backend for all three models:
+
+    fp32   the original PyTorch weights (default)
+    int8   PyTorch dynamic int8 quantisation of every Linear layer
+    onnx   ONNX Runtime via sentence-transformers / optimum (optional deps)
+
+    python -m rag.models --backend int8    # accuracy/latency delta vs fp32
+
+With ``PDFQUERY_MODEL_SERVER`` set, ``remote_models`` returns stand-ins that
+call a shared ``rag.server`` process instead of loading anything locally.
+"""
+import argparse
+import base64
+import json
+import os
+import threading
+import time
+
+from rag.serving import JsonClient
+
+ENCODER_MODEL = "all-MiniLM-L6-v2"
+RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+QA_MODEL = "deepset/roberta-base-squad2"
+
+BACKENDS = ("fp32", "int8", "onnx")
+BACKEND = os.environ.get("PDFQUERY_BACKEND", "fp32")
+WARM_UP = os.environ.get("PDFQUERY_WARMUP", "0") == "1"
+MODEL_SERVER = os.environ.get("PDFQUERY_MODEL_SERVER", "")
+
+
+class LazyModel:
+    """Proxy that loads the wrapped model on first attribute access or call."""
+
+    def __init__(self, name, loader, backend=BACKEND):
+        self.name = name
+        self.backend = backend
+        self.load_seconds = None
+        self._loader = loader
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    started = time.perf_counter()
+                    self._model = self._loader()
+                    self.load_seconds = time.perf_counter() - started
+        return self._model
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+
+# ----------- LOADERS -----------
+def _quantize(module):
+    import torch
+
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _onnx_missing(what, error):
+    return ImportError(f"The onnx backend for the {what} needs onnxruntime and optimum "
+                       f"(pip install 'optimum[onnxruntime]'): {error}")
+
+
+def load_encoder(backend=BACKEND):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        try:
+            return SentenceTransformer(ENCODER_MODEL, backend="onnx")
+        except ImportError as e:
+            raise _onnx_missing("encoder", e) from e
+    encoder = SentenceTransformer(ENCODER_MODEL)
+    return _quantize(encoder) if backend == "int8" else encoder
+
+
+def load_reranker(backend=BACKEND):
+    from sentence_transformers import CrossEncoder
+
+    if backend == "onnx":
+        try:
+            return CrossEncoder(RERANKER_MODEL, backend="onnx")
+        except (ImportError, TypeError) as e:
+            # TypeError: sentence-transformers too old for CrossEncoder backends
+            raise _onnx_missing("reranker", e) from e
+    reranker = CrossEncoder(RERANKER_MODEL)
+    if backend == "int8":
+        reranker.model = _quantize(reranker.model)
+    return reranker
+
+
+def load_qa(backend=BACKEND):
+    from transformers import AutoTokenizer, pipeline
+
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForQuestionAnswering
+        except ImportError as e:
+            raise _onnx_missing("QA model", e) from e
+        model = ORTModelForQuestionAnswering.from_pretrained(QA_MODEL, export=True)
+        return pipeline("question-answering", model=model, tokenizer=AutoTokenizer.from_pretrained(QA_MODEL))
+    qa = pipeline("question-answering", model=QA_MODEL)
+    if backend == "int8":
+        qa.model = _quantize(qa.model)
+    return qa
+
+
+def lazy_models(backend=BACKEND):
+    """``(encoder, reranker, qa)`` proxies; nothing is loaded yet."""
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}, expected one of {BACKENDS}")
+    return (
+        LazyModel("encoder", lambda: load_encoder(backend), backend),
+        LazyModel("reranker", lambda: load_reranker(backend), backend),
+        LazyModel("qa", lambda: load_qa(backend), backend),
+    )
+
+
+def warm_up(encoder, reranker, qa):
+    """Load the models and run one tiny pass each, in a daemon thread."""
+    def run():
+        encoder.encode(["warm up"])
+        reranker.predict([["warm up", "warm up"]])
+        qa(question="What is this?", context="This is a warm-up.")
+
+    thread = threading.Thread(target=run, name="pdfquery-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+# ----------- MODEL SERVER CLIENTS -----------
+class RemoteModel:
+    """Stand-in for a model served by ``rag.server``; mirrors ``LazyModel``'s status."""
+
+    def __init__(self, name, client):
+        self.name = name
+        self.client = client
+        self._health = None
+
+    def health(self):
+        if self._health is None:
+            self._health = self.client.get("/health")
+        return self._health
+
+    @property
+    def loaded(self):
+        return True
+
+    @property
+    def load_seconds(self):
+        return self.health()["load_seconds"][self.name]
+
+    @property
+    def backend(self):
+        return self.health()["backend"]
+
+
+class RemoteEncoder(RemoteModel):
+    def encode(self, sentences, batch_size=None, **kwargs):
+        import numpy as np
+
+        single = isinstance(sentences, str)
+        data = self.client.post("/encode", {"texts": [sentences] if single else list(sentences)})
+        vectors = np.frombuffer(base64.b64decode(data["embeddings"]), dtype="float32").reshape(-1, data["dim"])
+        return vectors[0] if single else vectors
+
+    def get_sentence_embedding_dimension(self):
+        return self.health()["dim"]
+
+
+class RemoteReranker(RemoteModel):
+    def predict(self, pairs, batch_size=None, **kwargs):
+        import numpy as np
+
+        return np.asarray(self.client.post("/rerank", {"pairs": [list(p) for p in pairs]})["scores"], dtype="float32")
+
+
+class RemoteQA(RemoteModel):
+    def __call__(self, question, context, batch_size=None, **kwargs):
+        single = isinstance(question, str) and isinstance(context, str)
+        answers = self.client.post("/qa", {"question": question, "context": context})["answers"]
+        return answers[0] if single else answers
+
+
+def remote_models(url=MODEL_SERVER):
+    """``(encoder, reranker, qa)`` clients for a running ``rag.server``."""
+    client = JsonClient(url)
+    return RemoteEncoder("encoder", client), RemoteReranker("reranker", client), RemoteQA("qa", client)
+
+
+# ----------- ACCURACY DELTA REPORT -----------
+SAMPLE_QUESTIONS = [
+    "What is the main topic of this chapter?",
+    "Define the central limit theorem.",
+    "What is photosynthesis?",
+    "Who proposed the theory of evolution?",
+]
+
+
+def sample_passages(limit=32):
+    from rag.corpus import open_corpus
+
+    corpus = open_corpus()
+    rows = range(0, corpus.count, max(1, corpus.count // limit))
+    return [corpus.text(*corpus.locate(row)) for row in rows][:limit]
+
+
+def timed(fn):
+    """``fn()`` and the milliseconds it took."""
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def accuracy_report(backend, passages, questions=SAMPLE_QUESTIONS):
+    """Compare ``backend`` against fp32 on the same inputs."""
+    import numpy as np
+
+    report = {"backend": backend, "passages": len(passages), "questions": len(questions)}
+    pairs = [[q, p] for q in questions for p in passages]
+
+    base, base_ms = timed(lambda: np.asarray(load_encoder("fp32").encode(passages)))
+    other, other_ms = timed(lambda: np.asarray(load_encoder(backend).encode(passages)))
+    cosine = (base * other).sum(1) / (np.linalg.norm(base, axis=1) * np.linalg.norm(other, axis=1))
+    report["encoder"] = {"mean_cosine": float(cosine.mean()), "min_cosine": float(cosine.min()),
+                         "fp32_ms": base_ms, "ms": other_ms}
+
+    base, base_ms = timed(lambda: np.asarray(load_reranker("fp32").predict(pairs)))
+    other, other_ms = timed(lambda: np.asarray(load_reranker(backend).predict(pairs)))
+    base_top = base.reshape(len(questions), -1).argmax(1)
+    other_top = other.reshape(len(questions), -1).argmax(1)
+    report["reranker"] = {"max_abs_diff": float(np.abs(base - other).max()),
+                          "top1_agreement": float((base_top == other_top).mean()),
+                          "fp32_ms": base_ms, "ms": other_ms}
+
+    contexts = [passages[i] for i in base_top]
+    kwargs = {"question": questions, "context": contexts, "batch_size": len(questions)}
+    base, base_ms = timed(lambda: load_qa("fp32")(**kwargs))
+    other, other_ms = timed(lambda: load_qa(backend)(**kwargs))
+    report["qa"] = {"exact_match": float(np.mean([a["answer"] == b["answer"] for a, b in zip(base, other)])),
+                    "max_score_diff": float(max(abs(a["score"] - b["score"]) for a, b in zip(base, other))),
+                    "fp32_ms": base_ms, "ms": other_ms}
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy and latency of a quantised backend against fp32.")
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "fp32"], default="int8")
+    parser.add_argument("--passages", type=int, default=32, help="stored chunks to sample from the corpus")
+    args = parser.parse_args()
+    print(json.dumps(accuracy_report(args.backend, sample_passages(args.passages)), indent=2))
@@ -0,0 +1,49 @@
+"""Extractive question answering over the reranked contexts."""
+import time
+
+
+def generate_answer(query, contexts, qa_pipeline, step=None, confidence=None, deadline=None):
+    """Answer ``query`` from ``contexts`` with batched QA forward passes.
+
+    By default every (question, context) pair goes through the pipeline in
+    one batch and the highest-scoring span across the batch wins, which is
+    what the old per-context loop picked. With ``step`` the contexts are
+    run ``step`` at a time, best first, stopping once a span scores at least
+    ``confidence`` or the next batch would not finish before ``deadline``
+    (a ``time.perf_counter()`` value); the first batch always runs.
+
+    Returns ``(answer, context, stats)``; answer and context are None when
+    no span scores above zero.
+    """
+    start = time.perf_counter()
+    # The QA pipeline rejects empty contexts, which the old loop hid
+    # behind a bare except
+    contexts = [c for c in contexts if c and c.strip()]
+    stats = {"contexts": len(contexts), "qa_ms": 0.0, "batches": 0, "stopped": None}
+    if not contexts:
+        return None, None, stats
+
+    step = step or len(contexts)
+    results = []
+    for lo in range(0, len(contexts), step):
+        batch_started = time.perf_counter()
+        batch = contexts[lo:lo + step]
+        out = qa_pipeline(question=[query] * len(batch), context=batch, batch_size=len(batch))
+        results.extend([out] if isinstance(out, dict) else out)
+        stats["batches"] += 1
+
+        if confidence is not None and max(r["score"] for r in results) >= confidence:
+            stats["stopped"] = "confident"
+            break
+        batch_seconds = time.perf_counter() - batch_started
+        if deadline is not None and time.perf_counter() + batch_seconds > deadline and lo + step < len(contexts):
+            stats["stopped"] = "budget"
+            break
+
+    best = max(range(len(results)), key=lambda i: results[i]["score"])
+    stats["contexts_read"] = len(results)
+    stats["qa_ms"] = (time.perf_counter() - start) * 1000
+    stats["score"] = float(results[best]["score"])
+    if results[best]["score"] <= 0:
+        return None, None, stats
+    return results[best]["answer"], contexts[best], stats
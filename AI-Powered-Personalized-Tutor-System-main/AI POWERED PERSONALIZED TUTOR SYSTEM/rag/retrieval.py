@@ -0,0 +1,139 @@
+"""Hybrid retrieval over the corpus followed by cross-encoder reranking.
+
+Dense (MiniLM) and lexical (BM25) searches each return a pool of rows,
+which are merged by reciprocal-rank fusion; only the fused top candidates
+reach the cross-encoder, so exact-term questions are covered without
+raising ``k``.
+
+With a ``Cascade`` the expensive stages adapt to each query:
+
+* reranking is skipped when the bi-encoder's best hit beats the runner-up
+  by ``skip_gap`` (squared L2 distance), and only the first ``shrunk``
+  candidates are reranked when the gap is at least ``shrink_gap``; since
+  that gap is a dense-search verdict, the candidates then go (or are cut)
+  in dense order, with lexical-only rows after them in fused order. With
+  fewer than two dense hits there is no gap and everything is reranked;
+* QA reads ``qa_step`` contexts at a time and stops once a span scores
+  ``qa_confidence`` or more;
+* no new stage is started once ``budget_ms`` is spent, except that at
+  least one QA batch always runs.
+
+Every decision goes into a trace dict so the thresholds can be tuned.
+"""
+import os
+import time
+from collections import namedtuple
+
+from rag.lexical import rrf
+from rag.qa import generate_answer
+
+Hit = namedtuple("Hit", ["doc_id", "chunk_id", "text", "score"])
+
+Cascade = namedtuple("Cascade", [
+    "pool", "candidates", "top_n", "skip_gap", "shrink_gap", "shrunk", "qa_confidence", "qa_step", "budget_ms",
+])
+
+DEFAULT_CASCADE = Cascade(
+    pool=int(os.environ.get("PDFQUERY_POOL", "20")),
+    candidates=int(os.environ.get("PDFQUERY_CANDIDATES", "8")),
+    top_n=5,
+    skip_gap=float(os.environ.get("PDFQUERY_SKIP_GAP", "0.3")),
+    shrink_gap=float(os.environ.get("PDFQUERY_SHRINK_GAP", "0.1")),
+    shrunk=5,
+    qa_confidence=float(os.environ.get("PDFQUERY_QA_CONFIDENCE", "0.6")),
+    qa_step=2,
+    budget_ms=float(os.environ.get("PDFQUERY_BUDGET_MS", "2000")),
+)
+
+
+def _ms_since(started):
+    return (time.perf_counter() - started) * 1000
+
+
+def _dense_first(found, dense, corpus):
+    """``found`` reordered by dense rank; rows only BM25 found keep fused order after them."""
+    rank = {corpus.locate(row): i for i, (row, _) in enumerate(dense)}
+    return sorted(found, key=lambda item: rank.get(item[0], len(rank)))
+
+
+def retrieve(query, corpus, encoder, reranker, k=10, top_n=5, doc_ids=None, query_emb=None,
+             cascade=None, trace=None, started=None):
+    """Search the whole corpus once (or only ``doc_ids``) and rerank the top ``k``.
+
+    Dense and BM25 results are fused and cut to ``k`` candidates before
+    reranking. Without a ``cascade`` every candidate is reranked.
+    ``trace`` (a dict) collects the cascade's decisions; ``started`` is
+    the query's ``time.perf_counter()`` start for the latency budget.
+    """
+    started = started or time.perf_counter()
+    trace = trace if trace is not None else {}
+    pool = k
+    if cascade is not None:
+        pool, k, top_n = cascade.pool, cascade.candidates, cascade.top_n
+
+    if query_emb is None:
+        query_emb = encoder.encode([query])
+    distances, rows = corpus.search(query_emb, pool, doc_ids)
+    dense = [(int(row), float(d)) for row, d in zip(rows[0], distances[0]) if row >= 0]
+    _, lexical = corpus.search_lexical(query, pool, doc_ids)
+    fused = rrf([[row for row, _ in dense], lexical.tolist()])[:k]
+    found = [(corpus.locate(row), score) for row, score in fused]
+    corpus.touch(doc_id for (doc_id, _), _ in found)
+    trace["dense"] = len(dense)
+    trace["lexical"] = len(lexical)
+    trace["candidates"] = len(found)
+    trace["search_ms"] = _ms_since(started)
+    if not found:
+        return []
+
+    rerank = len(found)
+    if cascade is not None:
+        gap = dense[1][1] - dense[0][1] if len(dense) > 1 else None
+        trace["gap"] = gap
+        if trace["search_ms"] >= cascade.budget_ms:
+            rerank, trace["rerank"] = 0, "skipped: over budget"
+        elif len(found) == 1:
+            rerank, trace["rerank"] = 0, "skipped: single candidate"
+        elif gap is None:
+            # Too few dense hits to judge (e.g. only BM25 matched): rerank all
+            trace["rerank"] = "full: no dense gap"
+        elif gap >= cascade.skip_gap:
+            found = _dense_first(found, dense, corpus)
+            rerank, trace["rerank"] = 0, "skipped: decisive gap"
+        elif gap >= cascade.shrink_gap:
+            found = _dense_first(found, dense, corpus)
+            rerank, trace["rerank"] = min(cascade.shrunk, len(found)), "shrunk"
+        else:
+            trace["rerank"] = "full"
+    trace["reranked"] = rerank
+
+    if rerank == 0:
+        # Fused (or dense-first) order; the score is the RRF score
+        return [Hit(d, c, corpus.text(d, c), score) for (d, c), score in found[:top_n]]
+
+    candidates = [loc for loc, _ in found[:rerank]]
+    texts = [corpus.text(doc_id, chunk_id) for doc_id, chunk_id in candidates]
+    scores = reranker.predict([[query, text] for text in texts])
+    ranked = sorted(zip(candidates, texts, scores), key=lambda x: x[2], reverse=True)
+    trace["rerank_ms"] = _ms_since(started) - trace["search_ms"]
+    return [Hit(doc_id, chunk_id, text, float(score)) for (doc_id, chunk_id), text, score in ranked[:top_n]]
+
+
+def answer_query(query, corpus, encoder, reranker, qa_pipeline, doc_ids=None, query_emb=None,
+                 cascade=DEFAULT_CASCADE):
+    """Retrieve and answer within the cascade's budget.
+
+    Returns ``(hits, answer, context, trace)``.
+    """
+    started = time.perf_counter()
+    trace = {"budget_ms": cascade.budget_ms}
+    hits = retrieve(query, corpus, encoder, reranker, doc_ids=doc_ids, query_emb=query_emb,
+                    cascade=cascade, trace=trace, started=started)
+    answer, context, trace["qa"] = generate_answer(
+        query, [hit.text for hit in hits], qa_pipeline,
+        step=cascade.qa_step, confidence=cascade.qa_confidence,
+        deadline=started + cascade.budget_ms / 1000,
+    )
+    trace["total_ms"] = _ms_since(started)
+    trace["over_budget"] = trace["total_ms"] > cascade.budget_ms
+    return hits, answer, context, trace
@@ -0,0 +1,116 @@
+"""Local model server for PdfQuery with cross-session dynamic batching.
+
+One process holds the encoder, reranker and QA model. Requests from every
+Streamlit session (and indexing job) are queued per model and grouped into
+micro-batches (see ``rag.serving.MicroBatcher``), so 30 students asking at
+once cost a few batched forward passes instead of 30 single ones::
+
+    python -m rag.server [--port 8765] [--backend int8] [--max-batch 32] [--max-wait-ms 5]
+    PDFQUERY_MODEL_SERVER=http://127.0.0.1:8765 streamlit run LoginPage.py
+
+Endpoints (JSON in and out):
+
+    POST /encode   {"texts": [...]}                   -> {"dim", "embeddings": base64 float32}
+    POST /rerank   {"pairs": [[query, text], ...]}    -> {"scores": [...]}
+    POST /qa       {"question": [...], "context": [...]} -> {"answers": [{"answer", "score", ...}]}
+    GET  /health   model load times and batching statistics
+"""
+import argparse
+import asyncio
+import base64
+import time
+
+import numpy as np
+
+from rag.models import BACKEND, BACKENDS, load_encoder, load_qa, load_reranker
+from rag.serving import MAX_BATCH, MAX_WAIT_MS, MicroBatcher, serve_json
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+
+
+def _encode_batch(encoder):
+    def run(texts):
+        return list(np.asarray(encoder.encode(texts, batch_size=len(texts)), dtype="float32"))
+    return run
+
+
+def _rerank_batch(reranker):
+    def run(pairs):
+        return [float(s) for s in reranker.predict(pairs, batch_size=len(pairs))]
+    return run
+
+
+def _qa_batch(qa):
+    def run(items):
+        out = qa(question=[q for q, _ in items], context=[c for _, c in items], batch_size=len(items))
+        return [out] if isinstance(out, dict) else out
+    return run
+
+
+def _as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+def load_models(backend):
+    models, load_seconds = {}, {}
+    for name, loader in (("encoder", load_encoder), ("reranker", load_reranker), ("qa", load_qa)):
+        started = time.perf_counter()
+        models[name] = loader(backend)
+        load_seconds[name] = time.perf_counter() - started
+    return models, load_seconds
+
+
+async def serve(host=SERVER_HOST, port=SERVER_PORT, backend=BACKEND, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+    models, load_seconds = load_models(backend)
+    dim = models["encoder"].get_sentence_embedding_dimension()
+    batchers = {
+        "encode": MicroBatcher(_encode_batch(models["encoder"]), max_batch, max_wait_ms, "encode"),
+        "rerank": MicroBatcher(_rerank_batch(models["reranker"]), max_batch, max_wait_ms, "rerank"),
+        "qa": MicroBatcher(_qa_batch(models["qa"]), max_batch, max_wait_ms, "qa"),
+    }
+    for batcher in batchers.values():
+        batcher.start()
+
+    async def encode(payload):
+        rows = await batchers["encode"].submit_many(_as_list(payload["texts"]))
+        vectors = np.stack(rows) if rows else np.zeros((0, dim), dtype="float32")
+        return {"dim": dim, "embeddings": base64.b64encode(vectors.tobytes()).decode("ascii")}
+
+    async def rerank(payload):
+        return {"scores": await batchers["rerank"].submit_many([tuple(p) for p in payload["pairs"]])}
+
+    async def qa(payload):
+        questions, contexts = _as_list(payload["question"]), _as_list(payload["context"])
+        if len(questions) != len(contexts):
+            raise ValueError("question and context must have the same length")
+        return {"answers": await batchers["qa"].submit_many(list(zip(questions, contexts)))}
+
+    async def health(_):
+        return {
+            "status": "ok",
+            "backend": backend,
+            "dim": dim,
+            "load_seconds": load_seconds,
+            "batching": {name: batcher.stats() for name, batcher in batchers.items()},
+        }
+
+    routes = {
+        ("POST", "/encode"): encode,
+        ("POST", "/rerank"): rerank,
+        ("POST", "/qa"): qa,
+        ("GET", "/health"): health,
+    }
+    print(f"Serving {backend} models on http://{host}:{port} (batch <= {max_batch}, wait <= {max_wait_ms} ms)")
+    await serve_json(routes, host, port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the PdfQuery models with micro-batching.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.backend, args.max_batch, args.max_wait_ms))
@@ -0,0 +1,215 @@
+"""Micro-batching and a minimal JSON-over-HTTP server on asyncio.
+
+``MicroBatcher`` turns many concurrent single-item requests into a few
+batched calls: items queue up, and a batch is sent to the model as soon as
+it is full or the first item has waited ``max_wait_ms``. The model call
+runs on a dedicated worker thread so the event loop keeps accepting
+requests while a batch is computing.
+
+``serve_json`` is just enough HTTP/1.1 (keep-alive, Content-Length bodies,
+JSON in and out) for local model servers, without adding a web framework.
+``JsonClient`` is the matching blocking client, one keep-alive connection
+per calling thread.
+"""
+import asyncio
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+MAX_BATCH = 32
+MAX_WAIT_MS = 5.0
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, name="batch"):
+        """``fn(items)`` must return one result per item, in order."""
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+        self._queue = None
+        self._worker = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix=f"{name}-model")
+
+    def start(self):
+        """Start the batching loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def submit_many(self, items):
+        return await asyncio.gather(*(self.submit(item) for item in items))
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            # Anything already queued joins for free
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self.fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.busy_seconds += time.perf_counter() - started
+            self.batches += 1
+            self.items += len(items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": self.items / self.batches if self.batches else 0.0,
+            "busy_seconds": self.busy_seconds,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+# ----------- HTTP -----------
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _to_json(value):
+    # numpy scalars and arrays from model outputs
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    method, target, _ = line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, value = line.decode("latin-1").split(":", 1)
+        headers[key.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, target.split("?", 1)[0], headers, body
+
+
+async def _respond(routes, method, path, body):
+    handler = routes.get((method, path))
+    if handler is None:
+        return HTTPStatus.NOT_FOUND, {"error": f"no route {method} {path}"}
+    try:
+        return HTTPStatus.OK, await handler(json.loads(body) if body else {})
+    except HttpError as e:
+        return HTTPStatus(e.status), {"error": str(e)}
+    except (KeyError, ValueError, TypeError) as e:
+        return HTTPStatus.BAD_REQUEST, {"error": f"{type(e).__name__}: {e}"}
+    except Exception as e:
+        return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+
+
+async def serve_json(routes, host, port):
+    """Serve ``{(method, path): async handler(payload) -> dict}`` forever."""
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await _respond(routes, method, path, body)
+                data = json.dumps(payload, default=_to_json).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+class JsonClient:
+    """Blocking JSON client with one keep-alive connection per thread."""
+
+    def __init__(self, url, timeout=60):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, "conn", None) is None:
+            self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._local.conn
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in (0, 1):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = json.loads(response.read() or b"{}")
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # The server closed an idle keep-alive connection: reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        if response.status != HTTPStatus.OK:
+            raise RuntimeError(f"{method} {path} failed with {response.status}: {data.get('error')}")
+        return data
+
+    def post(self, path, payload):
+        return self.request("POST", path, payload)
+
+    def get(self, path):
+        return self.request("GET", path)
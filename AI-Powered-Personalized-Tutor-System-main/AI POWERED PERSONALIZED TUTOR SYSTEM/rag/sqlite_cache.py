@@ -0,0 +1,27 @@
+"""Base for the SQLite caches under ``indices/`` (embeddings, page text).
+
+Each cache is one SQLite file in WAL mode, so the app and ingestion
+processes can share it; within a process one connection is shared by all
+threads behind a lock.
+"""
+import sqlite3
+import threading
+
+
+class SqliteCache:
+    def __init__(self, path, schema):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(schema)
+        self._db.commit()
+
+    def vacuum(self):
+        """Give deleted rows' space back to the file system (best effort)."""
+        with self._lock:
+            try:
+                self._db.execute("VACUUM")
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.OperationalError:
+                # Another process holds the database; try again next time
+                pass
@@ -0,0 +1,575 @@
+"""On-disk index store for PdfQuery.
+
+Every indexed document lives in its own directory under ``indices/``::
+
+    indices/<doc_id>/
+        CURRENT       name of the live version directory below
+        access        empty file whose mtime is the document's last access
+        summary.json  cached document summary (see rag.summarize)
+        v<version>/
+            meta.json     dimensions, chunk count, source name
+            vectors.f32   embeddings as one contiguous float32 (count, dim) array
+            chunks.bin    all chunk texts concatenated as UTF-8
+            offsets.i64   int64 byte offsets into chunks.bin (count + 1 entries)
+            pages.i32     1-based source page of every chunk (absent for old indices)
+            lexical.npz   BM25 inverted index over the chunks (see rag.lexical)
+
+Stores written before versioning keep the version files directly in
+``indices/<doc_id>/`` and are read in place.
+
+Documents being indexed are written to ``indices/.<doc_id>.partial/`` by
+``StoreWriter`` and published as a new version when complete: the
+directory is renamed to a fresh name and ``CURRENT`` is rewritten to point
+at it. A live version is never replaced or deleted in place, since other
+sessions may have its files memory-mapped (and Windows refuses to delete
+or rename over a mapped file); superseded versions are pruned afterwards
+and whatever is still mapped is retried by ``rag.housekeeping``.
+
+Vectors, text and offsets are opened with ``np.memmap`` so loading an index is
+close to zero-copy and every worker process shares the same page cache.
+Documents are searched through the corpus (see ``rag.corpus``), which owns
+the only ANN index; a document's own vectors are the rows the corpus copies.
+
+``meta.json`` records the document's size on disk and ``record_access``
+its last use, which ``rag.housekeeping`` uses for LRU eviction under a
+disk quota.
+"""
+import argparse
+import glob
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from rag.lexical import LEXICAL_FILE, build_lexical, load_lexical
+
+INDEX_DIR = "indices"
+LEGACY_PDF_INDEX = "pdf_index.pkl"
+# Legacy pickles whose document was removed, so they aren't migrated back
+RETIRED_PICKLES = os.path.join(INDEX_DIR, "_retired_pickles.json")
+STORE_VERSION = 1
+# Access times only need minute resolution; don't touch the disk per query
+ACCESS_RESOLUTION = 60
+CURRENT = "CURRENT"
+# Superseded versions kept besides the live one, for readers that resolved
+# CURRENT just before it moved on
+KEEP_VERSIONS = 1
+# Files of one version (also found directly in a pre-versioning store;
+# index.faiss only in stores from before the corpus owned the ANN index)
+VERSION_FILES = ("meta.json", "vectors.f32", "chunks.bin", "offsets.i64", "pages.i32", "index.faiss", LEXICAL_FILE)
+
+_last_recorded = {}
+_access_lock = threading.Lock()
+
+
+# ----------- READ SIDE -----------
+class ChunkText:
+    """Read-only list-like view over the chunk blob; decodes on access."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return max(len(self.offsets) - 1, 0)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return bytes(self.blob[start:end]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class StoredIndex:
+    """A loaded document: memory-mapped vectors, chunk text and pages."""
+
+    def __init__(self, doc_id, meta, vectors, chunks, pages=None):
+        self.doc_id = doc_id
+        self.meta = meta
+        self.vectors = vectors
+        self.chunks = chunks
+        self.pages = pages
+        self._lexical = None
+
+    @property
+    def lexical(self):
+        """The BM25 index, built and stored on first use for older stores."""
+        if self._lexical is None:
+            self._lexical = ensure_lexical(self.doc_id, self.chunks)
+        return self._lexical
+
+    def page_of(self, chunk_id):
+        if self.pages is None:
+            return None
+        return int(self.pages[chunk_id])
+
+    def pin(self):
+        """Copy chunk text and pages into RAM so reads never fault pages in."""
+        self.chunks = ChunkText(bytes(self.chunks.blob), np.array(self.chunks.offsets))
+        if self.pages is not None:
+            self.pages = np.array(self.pages)
+        return self
+
+
+# ----------- VERSIONED DIRECTORIES -----------
+def live_dir(root):
+    """The live version directory of ``root``, or None if it has none."""
+    try:
+        with open(os.path.join(root, CURRENT), encoding="utf-8") as f:
+            name = f.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        # Pre-versioning layout: the files sit in the root itself
+        return root if os.path.exists(os.path.join(root, "meta.json")) else None
+    path = os.path.join(root, name)
+    return path if name and os.path.isdir(path) else None
+
+
+def publish_dir(root, staged):
+    """Rename the finished ``staged`` directory into ``root`` as its live version."""
+    os.makedirs(root, exist_ok=True)
+    name = f"v{time.time_ns():x}"
+    os.replace(staged, os.path.join(root, name))
+    tmp = os.path.join(root, f"{CURRENT}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(root, CURRENT))
+    prune_versions(root)
+    return os.path.join(root, name)
+
+
+def superseded_versions(root, keep=KEEP_VERSIONS):
+    """Paths under ``root`` that no longer belong to its live version."""
+    live = live_dir(root)
+    if live is None or live == root or not os.path.isdir(root):
+        return []
+    # Version names are fixed-width hex timestamps: newest sorts last
+    versions = sorted(
+        (name for name in os.listdir(root) if name.startswith("v") and os.path.isdir(os.path.join(root, name))),
+        reverse=True,
+    )
+    old = [os.path.join(root, name) for name in versions if os.path.join(root, name) != live][keep:]
+    # Files left behind by the pre-versioning layout
+    old += [os.path.join(root, name) for name in VERSION_FILES if os.path.isfile(os.path.join(root, name))]
+    return old
+
+
+def remove_path(path):
+    """Delete a file or directory tree as far as possible (mapped files are skipped)."""
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def prune_versions(root, keep=KEEP_VERSIONS):
+    """Best-effort removal of superseded versions; returns what was targeted."""
+    old = superseded_versions(root, keep)
+    for path in old:
+        remove_path(path)
+    return old
+
+
+def drop_dir(root):
+    """Retire ``root`` as a whole: unpublish it first, then delete what can be deleted."""
+    for name in (CURRENT, "meta.json"):
+        remove_path(os.path.join(root, name))
+    shutil.rmtree(root, ignore_errors=True)
+
+
+# ----------- LOCKING -----------
+class FileLock:
+    """Exclusive lock shared between processes (and threads) via ``path``.
+
+    The OS releases it if the holder dies, so a crash never leaves it stuck.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a+b")
+        if os.name == "nt":
+            import msvcrt
+            self._file.seek(0)
+            while True:
+                try:
+                    # Retries for ~10 s before raising; keep waiting
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+            self._thread_lock.release()
+
+
+# ----------- DOCUMENT PATHS -----------
+def _root(doc_id):
+    return os.path.join(INDEX_DIR, doc_id)
+
+
+def _path(doc_id, name=""):
+    """``name`` inside the document's live version."""
+    return os.path.join(live_dir(_root(doc_id)) or _root(doc_id), name)
+
+
+def document_path(doc_id, name=""):
+    return _path(doc_id, name)
+
+
+def _map(path, dtype, shape):
+    # np.memmap refuses zero-length files, which an empty document produces
+    if os.path.getsize(path) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def list_documents():
+    """Doc ids of every stored document (``_``/``.`` entries are internal)."""
+    if not os.path.isdir(INDEX_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(INDEX_DIR)
+        if not name.startswith(("_", ".")) and index_exists(name)
+    )
+
+
+def index_exists(doc_id):
+    live = live_dir(_root(doc_id))
+    return live is not None and os.path.exists(os.path.join(live, "meta.json"))
+
+
+def read_meta(doc_id):
+    with open(_path(doc_id, "meta.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(folder, name))
+               for folder, _, files in os.walk(path) for name in files)
+
+
+def document_size(doc_id):
+    """Bytes on disk, as recorded at commit or measured for older stores."""
+    size = read_meta(doc_id).get("bytes")
+    return size if size is not None else directory_size(_path(doc_id))
+
+
+def record_access(doc_id, now=None):
+    """Mark ``doc_id`` as used now (at most once per ``ACCESS_RESOLUTION``)."""
+    now = now or time.time()
+    with _access_lock:
+        if now - _last_recorded.get(doc_id, 0) < ACCESS_RESOLUTION:
+            return
+        _last_recorded[doc_id] = now
+    path = os.path.join(_root(doc_id), "access")
+    try:
+        with open(path, "a"):
+            os.utime(path, (now, now))
+    except FileNotFoundError:
+        # Evicted or never committed
+        pass
+
+
+def last_access(doc_id):
+    """Last recorded use, falling back to when the document was indexed."""
+    try:
+        return os.path.getmtime(os.path.join(_root(doc_id), "access"))
+    except OSError:
+        return read_meta(doc_id).get("indexed_at", 0)
+
+
+def load_index(doc_id):
+    # Resolve the version once so every file comes from the same one
+    base = _path(doc_id)
+    with open(os.path.join(base, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    count, dim = meta["count"], meta["dim"]
+    vectors = _map(os.path.join(base, "vectors.f32"), "float32", (count, dim))
+    offsets = _map(os.path.join(base, "offsets.i64"), "int64", (count + 1,))
+    blob = _map(os.path.join(base, "chunks.bin"), "uint8", (int(offsets[-1]),))
+    pages = None
+    if os.path.exists(os.path.join(base, "pages.i32")):
+        pages = _map(os.path.join(base, "pages.i32"), "int32", (count,))
+    return StoredIndex(doc_id, meta, vectors, ChunkText(blob, offsets), pages)
+
+
+def ensure_lexical(doc_id, chunks=None):
+    """Load the document's BM25 index, building it from its chunks if missing."""
+    path = _path(doc_id, LEXICAL_FILE)
+    if os.path.exists(path):
+        return load_lexical(path)
+    lexical = build_lexical(chunks if chunks is not None else load_index(doc_id).chunks)
+    lexical.save(path)
+    return lexical
+
+
+# ----------- WRITE SIDE -----------
+class StoreWriter:
+    """Append-only writer for one document, resumable after a crash.
+
+    Rows are appended to ``indices/.<doc_id>.partial/`` as they are produced,
+    so memory stays bounded by one batch. ``checkpoint`` records how much of
+    each file is valid; reopening with ``resume=True`` truncates anything
+    written after the last checkpoint and carries on from there. ``commit``
+    writes meta.json and publishes the directory as the live version.
+    """
+
+    FILES = ("vectors.f32", "chunks.bin", "offsets.i64", "pages.i32")
+
+    def __init__(self, doc_id, dim=None, resume=False):
+        self.doc_id = doc_id
+        self.dir = os.path.join(INDEX_DIR, f".{doc_id}.partial")
+        self.state = {"count": 0, "text_bytes": 0, "dim": dim, "has_pages": None, "extra": {}}
+
+        progress = os.path.join(self.dir, "progress.json")
+        if resume and os.path.exists(progress):
+            with open(progress, encoding="utf-8") as f:
+                self.state = json.load(f)
+            self._truncate()
+        else:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            os.makedirs(self.dir)
+            for name in self.FILES:
+                open(os.path.join(self.dir, name), "wb").close()
+            np.zeros(1, dtype="int64").tofile(os.path.join(self.dir, "offsets.i64"))
+        self._files = {name: open(os.path.join(self.dir, name), "ab") for name in self.FILES}
+
+    def _truncate(self):
+        count, dim = self.state["count"], self.state["dim"] or 0
+        sizes = {
+            "vectors.f32": count * dim * 4,
+            "chunks.bin": self.state["text_bytes"],
+            "offsets.i64": (count + 1) * 8,
+            "pages.i32": count * 4 if self.state["has_pages"] else 0,
+        }
+        for name, size in sizes.items():
+            os.truncate(os.path.join(self.dir, name), size)
+
+    @property
+    def count(self):
+        return self.state["count"]
+
+    def append(self, embeddings, chunks, pages=None):
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        if len(chunks) == 0:
+            return
+        if embeddings.ndim != 2 or len(embeddings) != len(chunks):
+            raise ValueError(f"expected one embedding row per chunk, got {embeddings.shape} for {len(chunks)} chunks")
+        if self.state["dim"] is None:
+            self.state["dim"] = int(embeddings.shape[1])
+        if self.state["has_pages"] is None:
+            self.state["has_pages"] = pages is not None
+
+        encoded = [c.encode("utf-8") for c in chunks]
+        ends = self.state["text_bytes"] + np.cumsum([len(b) for b in encoded], dtype="int64")
+        self._files["vectors.f32"].write(embeddings.tobytes())
+        self._files["chunks.bin"].write(b"".join(encoded))
+        self._files["offsets.i64"].write(ends.tobytes())
+        if self.state["has_pages"]:
+            self._files["pages.i32"].write(np.asarray(pages, dtype="int32").tobytes())
+
+        self.state["count"] += len(chunks)
+        self.state["text_bytes"] = int(ends[-1])
+
+    def checkpoint(self, **extra):
+        """Make everything appended so far durable and resumable."""
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        self.state["extra"].update(extra)
+        tmp = os.path.join(self.dir, "progress.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, os.path.join(self.dir, "progress.json"))
+
+    def pages(self):
+        if not self.state["has_pages"] or self.count == 0:
+            return np.zeros(0, dtype="int32")
+        return _map(os.path.join(self.dir, "pages.i32"), "int32", (self.count,))
+
+    def chunks(self):
+        """Read-only view of the chunk texts written so far."""
+        self.checkpoint()
+        offsets = _map(os.path.join(self.dir, "offsets.i64"), "int64", (self.count + 1,))
+        return ChunkText(_map(os.path.join(self.dir, "chunks.bin"), "uint8", (self.state["text_bytes"],)), offsets)
+
+    def vectors(self):
+        """Memory-mapped view of the rows written so far."""
+        self.checkpoint()
+        dim = self.state["dim"] or 0
+        if self.count == 0:
+            return np.zeros((0, dim), dtype="float32")
+        return _map(os.path.join(self.dir, "vectors.f32"), "float32", (self.count, dim))
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+    def commit(self, lexical=None, **extra_meta):
+        """Finish the document. The BM25 index is built from the written
+        chunks unless ``lexical`` is given."""
+        if lexical is None:
+            lexical = build_lexical(self.chunks())
+        lexical.save(os.path.join(self.dir, LEXICAL_FILE))
+        self.checkpoint()
+        self.close()
+        if not self.state["has_pages"]:
+            os.remove(os.path.join(self.dir, "pages.i32"))
+        os.remove(os.path.join(self.dir, "progress.json"))
+
+        meta = {
+            "version": STORE_VERSION,
+            "count": self.count,
+            "dim": self.state["dim"] or 0,
+            "indexed_at": time.time(),
+            "bytes": directory_size(self.dir),
+            **extra_meta,
+        }
+        with open(os.path.join(self.dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        publish_dir(_root(self.doc_id), self.dir)
+        return meta
+
+
+def save_index(doc_id, embeddings, chunks, pages=None, lexical=None, **extra_meta):
+    """Write a whole in-memory document index in one go."""
+    writer = StoreWriter(doc_id)
+    writer.append(embeddings, chunks, pages)
+    return writer.commit(lexical, **extra_meta)
+
+
+def delete_document(doc_id):
+    """Remove a document; files other sessions still map are left for housekeeping."""
+    drop_dir(_root(doc_id))
+
+
+# ----------- LEGACY PICKLE MIGRATION -----------
+class _LegacyUnpickler(pickle.Unpickler):
+    # Old pickles reference the CPU-specific SWIG module they were written
+    # with (e.g. faiss.swigfaiss_avx2), which may not exist on this host.
+    def find_class(self, module, name):
+        if module.startswith("faiss.swigfaiss"):
+            module = "faiss"
+        return super().find_class(module, name)
+
+
+def legacy_pickles():
+    paths = sorted(glob.glob(os.path.join(INDEX_DIR, "*.pkl")))
+    if os.path.exists(LEGACY_PDF_INDEX):
+        paths.append(LEGACY_PDF_INDEX)
+    return paths
+
+
+def legacy_document(path):
+    """``(doc_id, source)`` a legacy pickle is stored under.
+
+    The old upload path named its pickles after a hash of the PDF's *name*
+    and kept the PDF next to the app as ``temp_<id>.pdf``. Where that file
+    still exists the document is keyed on its content hash and named after
+    it, exactly as uploading the same PDF today would, so a re-upload finds
+    the migrated index instead of adding a duplicate.
+    """
+    from rag.ingest import content_hash
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    pdf = f"temp_{name}.pdf"
+    if os.path.exists(pdf):
+        with open(pdf, "rb") as f:
+            return content_hash(f), pdf
+    return name, os.path.basename(path)
+
+
+def retired_pickles():
+    try:
+        with open(RETIRED_PICKLES) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def retire_pickles(doc_id):
+    """Record the legacy pickles of a removed document so they stay removed."""
+    retired = retired_pickles()
+    paths = [path for path in legacy_pickles() if path not in retired and legacy_document(path)[0] == doc_id]
+    if paths:
+        retired.update(dict.fromkeys(paths, doc_id))
+        tmp = f"{RETIRED_PICKLES}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(retired, f, indent=2)
+        os.replace(tmp, RETIRED_PICKLES)
+    return paths
+
+
+def migrate_pickles(redo=False):
+    """Convert ``(index, embeddings, chunks)`` pickles into the new layout.
+
+    Runs once per pickle: anything whose doc id already has a store is
+    skipped, and so are the pickles of documents removed since (see
+    ``retire_pickles``) unless ``redo``. A store migrated earlier under the
+    pickle's name is dropped once the pickle can be keyed on its PDF's
+    content. The pickles are left in place so the migration can be redone.
+    """
+    retired = {} if redo else retired_pickles()
+    if redo and os.path.exists(RETIRED_PICKLES):
+        os.remove(RETIRED_PICKLES)
+    migrated = []
+    for path in legacy_pickles():
+        if path in retired:
+            continue
+        doc_id, source = legacy_document(path)
+        old_id = os.path.splitext(os.path.basename(path))[0]
+        if old_id != doc_id and index_exists(old_id) and read_meta(old_id).get("migrated_from") == path:
+            delete_document(old_id)
+        if index_exists(doc_id):
+            continue
+        with open(path, "rb") as f:
+            _, embeddings, chunks = _LegacyUnpickler(f).load()
+        save_index(doc_id, embeddings, list(chunks), source=source, migrated_from=path)
+        migrated.append(doc_id)
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate legacy pickled indexes into the store.")
+    parser.add_argument("--redo", action="store_true", help="also migrate pickles of documents removed since")
+    args = parser.parse_args()
+
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    done = migrate_pickles(args.redo)
+    print(f"Migrated {len(done)} legacy index(es): {', '.join(done) or '-'}")
@@ -0,0 +1,78 @@
+"""Map-reduce summaries over the chunks already stored at indexing time.
+
+Chunks are packed into groups that fit the summariser's input window and
+summarised in batches (map); the partial summaries are packed and
+summarised again (reduce) until one summary is left, so the whole document
+is covered rather than its first 1024 characters. The result is written to
+``indices/<doc_id>/summary.json`` and reused until the document is
+re-indexed.
+"""
+import json
+import os
+
+from rag.store import INDEX_DIR, load_index, read_meta
+
+SUMMARY_MODEL = "facebook/bart-large-cnn"
+# BART reads 1024 tokens; ~3000 characters of English stays under that
+GROUP_CHARS = 3000
+BATCH_SIZE = 8
+MAX_LENGTH = 130
+MIN_LENGTH = 30
+
+
+def _summary_path(doc_id):
+    return os.path.join(INDEX_DIR, doc_id, "summary.json")
+
+
+def pack(texts, limit=GROUP_CHARS):
+    """Concatenate consecutive texts into groups of at most ``limit`` characters."""
+    groups, current = [], ""
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        if current and len(current) + len(text) + 1 > limit:
+            groups.append(current)
+            current = ""
+        current = f"{current} {text}" if current else text[:limit]
+    if current:
+        groups.append(current)
+    return groups
+
+
+def summarize_texts(texts, summarizer, batch_size=BATCH_SIZE):
+    results = summarizer(
+        texts, max_length=MAX_LENGTH, min_length=MIN_LENGTH,
+        do_sample=False, truncation=True, batch_size=batch_size,
+    )
+    return [r["summary_text"] for r in results]
+
+
+def read_summary(doc_id):
+    """The stored summary, or None if missing or older than the index."""
+    if not os.path.exists(_summary_path(doc_id)):
+        return None
+    with open(_summary_path(doc_id), encoding="utf-8") as f:
+        stored = json.load(f)
+    if stored.get("indexed_at") != read_meta(doc_id).get("indexed_at"):
+        return None
+    return stored["summary"]
+
+
+def summarize_document(doc_id, summarizer, batch_size=BATCH_SIZE):
+    index = load_index(doc_id)
+    groups = pack(index.chunks)
+    levels = 0
+    while len(groups) > 1:
+        groups = pack(summarize_texts(groups, summarizer, batch_size))
+        levels += 1
+    summary = summarize_texts(groups, summarizer, batch_size)[0] if groups else ""
+
+    with open(_summary_path(doc_id), "w", encoding="utf-8") as f:
+        json.dump({
+            "summary": summary,
+            "model": SUMMARY_MODEL,
+            "levels": levels + 1,
+            "indexed_at": index.meta.get("indexed_at"),
+        }, f, indent=2)
+    return summary
@@ -0,0 +1,27 @@
+"""The compiled predictors must agree with the pickled pipelines on every row
+of ``Dataset/k-12.csv``::
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from predictors.compiled import VERIFY_DATA, verify  # noqa: E402
+from predictors.registry import MODELS, ModelRegistry  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return ModelRegistry(model_dir=APP_DIR)
+
+
+@pytest.mark.parametrize("name", list(MODELS))
+def test_compiled_matches_pipeline(registry, name):
+    report = verify(os.path.join(APP_DIR, VERIFY_DATA), [name], registry, repeat=1)[name]
+    assert report["rows"] > 0
+    assert report["mismatches"] == 0, f"{name}: {report['mismatches']} of {report['rows']} rows differ"